@@ -48,6 +48,12 @@ class EnglishLabels:
     string_nutrients_weight = "Weight"
 
     string_submit_button = "Calculate mix"
+    string_cancel_button = "Cancel"
+    string_solving = "Calculating... {seconds:.1f} s"
+    string_solve_cancelled = "Calculation cancelled"
+    string_solve_error = "The mix could not be calculated:\n{error}"
+    string_metrics_title = "Solver statistics"
+    string_metrics_none = "No calculation yet"
     string_reset_nutrients = "Erase all nutrients"
     string_reset_weights = "Reset all weights"
 
@@ -76,6 +82,9 @@ class EnglishLabels:
     # After solve
     string_results_title = "RESULTS"
 
+    string_no_solution = "No mix found. Try again with less restrictive parameters."
+    string_limit_reached = "Time limit reached: best mix found so far (gap from optimal mix: {gap:.1f}%)"
+
     string_objectives = "Objective values:"
     # string_delta = chr(948)   # greek letter delta
     string_delta = "Max deviation from target"
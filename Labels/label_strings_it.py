@@ -48,6 +48,12 @@ class ItalianLabels:
     string_nutrients_weight = "Peso"
 
     string_submit_button = "Calcola mix"
+    string_cancel_button = "Annulla"
+    string_solving = "Calcolo in corso... {seconds:.1f} s"
+    string_solve_cancelled = "Calcolo annullato"
+    string_solve_error = "Impossibile calcolare il mix:\n{error}"
+    string_metrics_title = "Statistiche del solutore"
+    string_metrics_none = "Nessun calcolo eseguito"
     string_reset_nutrients = "Cancella valori nutrienti"
     string_reset_weights = "Resetta tutti i pesi"
 
@@ -76,6 +82,9 @@ class ItalianLabels:
     # After solve
     string_results_title = "RISULTATI"
 
+    string_no_solution = "Nessun mix trovato. Riprovare con parametri meno restrittivi."
+    string_limit_reached = "Tempo limite raggiunto: miglior mix trovato finora (distanza dal mix ottimo: {gap:.1f}%)"
+
     string_objectives = "Valori obiettivo:"
     # string_delta = chr(948)   # greek letter delta
     string_delta = "Max deviazione dall'obiettivo"
@@ -0,0 +1,64 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Entry points of the app's solver process (see App.start_solver)
+# The app passes these functions to its process pool by reference: the solver (batch_solver, mix_calculator,
+# NumPy and Python-MIP) is imported only by the solver process, never by the app's one, which stays quick to start
+# The process builds its MixCalculator in a first task, not in the pool's initializer: when building it fails
+# (e.g. an invalid database) the error is raised by that task and the next task tries again,
+# while an error of a pool's initializer would make the pool start new processes forever
+
+
+# Arguments of batch_solver.init_worker, kept by init until the first task
+worker_args = ()
+
+
+# Initializer of the pool: only keep the arguments of batch_solver.init_worker (same order)
+def init(*args):
+    global worker_args
+    worker_args = args
+
+
+# Build the MixCalculator of the process, if not built yet
+def prepare():
+    import batch_solver
+    if batch_solver.calculator is None:
+        batch_solver.init_worker(*worker_args)
+
+
+# Solve one target (see batch_solver.solve_target) and return (result, metrics) as plain Python values:
+# status is the name of the solver's status, NumPy numbers are Python numbers (unpickling them would import the solver's modules)
+def solve_target_metrics(target):
+    import batch_solver
+    from solve_metrics import SolveMetrics
+    prepare()
+    result, metrics = batch_solver.solve_target_metrics(target)
+    result = plain(result[:7]) + (result[7].name, plain(result[8]))
+    return result, SolveMetrics(**plain(metrics.to_dict()))
+
+
+# Value with NumPy numbers (also inside lists, tuples and dictionaries) converted to Python numbers
+def plain(value):
+    import numpy as np
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return type(value)(plain(v) for v in value)
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    return value
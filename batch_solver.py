@@ -0,0 +1,105 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Solve many targets (e.g. all patients of a ward) in one call
+# Targets are distributed to a pool of processes, each one holding its own MixCalculator,
+# built once when the process starts and reused for all the targets it receives
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import constants
+from mix_calculator import BACKEND_AUTO, MixCalculator
+from results_cache import ResultsCache
+
+
+# Default model parameters (Mmax, Cmax, Vmin, Smax, Dmax), used for targets without parameters
+DEFAULT_PARAMS = (constants.DEFAULT_MMAX, constants.DEFAULT_CMAX, constants.DEFAULT_VMIN, constants.DEFAULT_SMAX, constants.DEFAULT_DMAX)
+
+# MixCalculator and results' cache of the current worker process
+calculator = None
+cache = None
+
+
+# Build the MixCalculator of a worker process (catalog and model) and its results' cache
+# max_seconds, max_gap : limits of the search for each target (see MixCalculator.set_limits)
+# cache_path : file where results are also saved (None to keep them only in memory)
+# formulas_db, solutions_db : paths of the databases (None for the app's databases)
+# staged : least waste and then least penalty among the mixes with the best delta (see MixCalculator.solve_stages)
+# inventory_db : inventory shared by the processes, each mix takes its bottles from it (None for the default stock)
+# backend : solver of the model (see MixCalculator.optimize_backend)
+# candidates : solve first with this number of candidate formulas and solutions (see MixCalculator.optimize_candidates)
+# metrics_log : file where the metrics of each solve are appended as JSON lines, shared by the processes (None for no log)
+def init_worker(max_seconds=constants.DEFAULT_MAX_SECONDS, max_gap=constants.DEFAULT_MAX_GAP, cache_path=None, formulas_db=None, solutions_db=None, staged=False,
+                inventory_db=None, backend=BACKEND_AUTO, candidates=None, metrics_log=None):
+    global calculator, cache
+    calculator = MixCalculator(*DEFAULT_PARAMS, max_seconds=max_seconds, max_gap=max_gap, formulas_db=formulas_db, solutions_db=solutions_db, staged=staged,
+                               inventory_db=inventory_db, backend=backend, candidates=candidates, metrics_log=metrics_log)
+    calculator.model.verbose = 0
+    cache = ResultsCache(constants.RESULTS_CACHE_SIZE, cache_path)
+
+
+# Solve one target in a worker process
+# target = (nutrients, weights, params), params can be None to use default parameters
+# With an inventory the mix takes its bottles from the shared stock (not cached, stock changes after each mix)
+def solve_target(target):
+    nutrients, weights, params = target
+    if params is None:
+        params = DEFAULT_PARAMS
+    calculator.set_params(*params)
+    if calculator.inventory is not None:
+        return calculator.solve_and_take(nutrients, weights)
+    return cache.solve(calculator, nutrients, weights)
+
+
+# Solve one target in a worker process and return (result, metrics), metrics being the SolveMetrics of the solve (see solve_metrics.py)
+def solve_target_metrics(target):
+    result = solve_target(target)
+    return result, calculator.metrics
+
+
+# Solve targets in parallel and yield results one at a time, in the same order as targets
+# targets : iterable of (nutrients, weights, params)
+# workers : number of processes (default: number of CPUs)
+# chunksize : number of targets sent to a process at once
+# max_seconds, max_gap : limits of the search for each target (see MixCalculator.set_limits)
+# cache_path : file of the results' cache shared by the processes (None to keep results only in memory)
+# formulas_db, solutions_db : paths of the databases (None for the app's databases)
+# staged : least waste and then least penalty among the mixes with the best delta (see MixCalculator.solve_stages)
+# inventory_db : inventory shared by the processes, each mix takes its bottles from it (None for the default stock)
+# backend : solver of the model (see MixCalculator.optimize_backend)
+# candidates : solve first with this number of candidate formulas and solutions (see MixCalculator.optimize_candidates)
+# metrics_log : file where the metrics of each solve are appended as JSON lines (None for no log)
+# metrics : yield (result, metrics) instead of result, metrics being the SolveMetrics of the solve (see solve_metrics.py)
+def iter_solve_batch(targets, workers=None, chunksize=1, max_seconds=constants.DEFAULT_MAX_SECONDS, max_gap=constants.DEFAULT_MAX_GAP, cache_path=None,
+                     formulas_db=None, solutions_db=None, staged=False, inventory_db=None, backend=BACKEND_AUTO, candidates=None, metrics_log=None, metrics=False):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers > 0, "Number of workers should be positive"
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(max_seconds, max_gap, cache_path, formulas_db, solutions_db, staged, inventory_db, backend, candidates, metrics_log)) as executor:
+        for result in executor.map(solve_target_metrics if metrics else solve_target, targets, chunksize=chunksize):
+            yield result
+
+
+# Solve targets in parallel and return the list of results, in the same order as targets
+# Each result is the same tuple returned by MixCalculator.solve, or (result, metrics) with metrics
+def solve_batch(targets, workers=None, chunksize=1, max_seconds=constants.DEFAULT_MAX_SECONDS, max_gap=constants.DEFAULT_MAX_GAP, cache_path=None,
+                formulas_db=None, solutions_db=None, staged=False, inventory_db=None, backend=BACKEND_AUTO, candidates=None, metrics_log=None, metrics=False):
+    return list(iter_solve_batch(targets, workers, chunksize, max_seconds, max_gap, cache_path, formulas_db, solutions_db, staged, inventory_db, backend,
+                                 candidates, metrics_log, metrics))
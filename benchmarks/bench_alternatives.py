@@ -0,0 +1,65 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: alternative mixes (MixCalculator.solve_alternatives)
+# Compares the time to find k mixes with distinct combinations of products on the same model
+# with k times the time of a cold solve (first solve of a new model), and checks that the model is unchanged afterwards
+# Run from the repository root: python -m benchmarks.bench_alternatives [number of targets] [k]
+
+import sys
+import time
+
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import MixCalculator
+
+
+N_TARGETS = 50
+K = 5
+
+
+def new_calculator():
+    calculator = MixCalculator()
+    calculator.model.verbose = 0
+    return calculator
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else K
+
+    engine = new_calculator()
+    rows = engine.model.num_rows
+    cold_seconds = 0.0
+    alternatives_seconds = 0.0
+    found = 0
+    for nutrients, weights in random_targets(n_targets):
+        cold = new_calculator()
+        start = time.perf_counter()
+        best = cold.solve(nutrients, weights)
+        cold_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = engine.solve_alternatives(nutrients, weights, k)
+        alternatives_seconds += time.perf_counter() - start
+        assert engine.model.num_rows == rows, "Cuts left in the model"
+        found += len(results)
+
+
+    print(f"{found} mixes found for {n_targets} targets (k = {k})")
+    print(f"cold solve: {1000 * cold_seconds / n_targets:.1f} ms per target, x{k} = {1000 * k * cold_seconds / n_targets:.1f} ms")
+    print(f"alternatives: {1000 * alternatives_seconds / n_targets:.1f} ms per target ({alternatives_seconds / (k * cold_seconds):.2f} of k cold solves)")
@@ -0,0 +1,75 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: solver backends of MixCalculator (cbc, highs, lp_round, auto) on the app's catalog and on a synthetic one
+# (see bench_catalog_load.py), for the same random targets
+# Reports time per target, targets without a mix, and quality against cbc: targets with a worse delta (beyond 0.1%)
+# and the largest relative difference of delta; with auto, how many targets each backend solved
+# Needs SciPy for backend highs (skipped otherwise)
+# Run from the repository root: python -m benchmarks.bench_backends [number of targets] [products in synthetic catalog]
+
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.bench_catalog_load import write_synthetic_catalog
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import BACKEND_AUTO, BACKEND_CBC, BACKEND_HIGHS, BACKEND_LP_ROUND, HAS_SCIPY, MixCalculator
+
+
+N_TARGETS = 30
+N_PRODUCTS = 2000
+MAX_SECONDS = 60
+WORSE_TOLERANCE = 1e-3
+
+
+def run(label, targets, formulas_db=None, solutions_db=None):
+    backends = [BACKEND_CBC, BACKEND_HIGHS, BACKEND_LP_ROUND, BACKEND_AUTO] if HAS_SCIPY else [BACKEND_CBC, BACKEND_LP_ROUND, BACKEND_AUTO]
+    reference = None
+    for backend in backends:
+        calculator = MixCalculator(max_seconds=MAX_SECONDS, formulas_db=formulas_db, solutions_db=solutions_db, backend=backend)
+        calculator.model.verbose = 0
+        used = Counter()
+        start = time.perf_counter()
+        deltas = []
+        for nutrients, weights in targets:
+            deltas.append(calculator.solve(nutrients, weights)[0][0])
+            used[calculator.backend_used] += 1
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference = deltas
+            print(f"{label}: {calculator.nFormulas + calculator.nSolutions} products, {calculator.model.num_rows} rows, {calculator.model.num_cols} columns")
+
+        pairs = [(delta, best) for delta, best in zip(deltas, reference) if delta is not None and best is not None]
+        worse = sum(1 for delta, best in pairs if delta > best * (1 + WORSE_TOLERANCE) + 1e-6)
+        difference = max((delta - best) / max(best, 1e-6) for delta, best in pairs) if len(pairs) > 0 else 0.0
+        solved_by = ", ".join(f"{name} {count}" for name, count in sorted(used.items())) if backend == BACKEND_AUTO else ""
+        print(f"  {backend:9} {1000 * seconds / len(targets):8.1f} ms/target  without mix {deltas.count(None):3d}  worse than cbc {worse:3d}  "
+              f"largest difference {100 * difference:6.2f}%  {solved_by}")
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+    n_products = int(sys.argv[2]) if len(sys.argv) > 2 else N_PRODUCTS
+    targets = random_targets(n_targets)
+
+    run("app's catalog", targets)
+    with tempfile.TemporaryDirectory() as directory:
+        formulas_db, solutions_db = write_synthetic_catalog(directory, n_products)
+        run("synthetic catalog", targets, formulas_db, solutions_db)
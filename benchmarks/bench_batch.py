@@ -0,0 +1,68 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark: throughput of batch_solver.solve_batch (solves/second) versus number of workers
+# Run from the repository root: python -m benchmarks.bench_batch [number of targets] [--stream]
+# With --stream, results are printed as soon as they are available
+
+import os
+import sys
+import time
+
+from batch_solver import iter_solve_batch, solve_batch
+from benchmarks.check_target_swap import random_targets
+
+
+N_TARGETS = 200
+CHUNKSIZE = 4
+
+
+def worker_counts():
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n_targets = int(args[0]) if args else N_TARGETS
+    targets = [(nutrients, weights, None) for nutrients, weights in random_targets(n_targets)]
+
+    if '--stream' in sys.argv:
+        for i, (objectives, m, c, formulas, solutions, nutrients, volume, status, gap) in enumerate(iter_solve_batch(targets, chunksize=CHUNKSIZE)):
+            if objectives[0] is None:
+                print(f"target {i}: no mix found ({status.name})")
+            else:
+                print(f"target {i}: delta = {objectives[0]:.4f}, {m} formulas, {c} solutions, V = {volume:.0f} mL ({status.name})")
+
+    print(f"{n_targets} targets, {os.cpu_count()} CPUs")
+    reference = None
+    for workers in worker_counts():
+        start = time.perf_counter()
+        results = solve_batch(targets, workers=workers, chunksize=CHUNKSIZE)
+        elapsed = time.perf_counter() - start
+
+        deltas = [r[0][0] for r in results]
+        if reference is None:
+            reference = deltas
+        assert deltas == reference, "Results depend on the number of workers"
+
+        print(f"workers = {workers}: {n_targets / elapsed:.1f} solves/s ({elapsed:.2f} s, including pool start-up)")
@@ -0,0 +1,80 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: candidate products (MixCalculator(candidates=K), see optimize_candidates) against the model with all products,
+# on the app's catalog and on a synthetic one (see bench_catalog_load.py), for the same random targets
+# Reports time per target, mixes of candidates (proven optimal, or feasible with their gap from the LP bound),
+# targets solved with all products, and quality: targets with a worse delta than with all products (beyond 0.1%) and the largest difference
+# Run from the repository root: python -m benchmarks.bench_candidates [number of targets] [products in synthetic catalog] [backend] [K ...]
+
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_catalog_load import write_synthetic_catalog
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import BACKEND_AUTO, MixCalculator
+
+
+N_TARGETS = 30
+N_PRODUCTS = 2000
+CANDIDATES = [5, 10, 20]
+MAX_SECONDS = 60
+WORSE_TOLERANCE = 1e-3
+
+
+def run(label, targets, backend, candidates, formulas_db=None, solutions_db=None):
+    reference = None
+    for k in [None] + candidates:
+        calculator = MixCalculator(max_seconds=MAX_SECONDS, formulas_db=formulas_db, solutions_db=solutions_db, backend=backend, candidates=k)
+        calculator.model.verbose = 0
+        deltas = []
+        gaps = []
+        restricted = {True: 0, False: 0, None: 0}
+        start = time.perf_counter()
+        for nutrients, weights in targets:
+            result = calculator.solve(nutrients, weights)
+            deltas.append(result[0][0])
+            restricted[calculator.restricted] += 1
+            if calculator.restricted and result[7].name == "FEASIBLE":
+                gaps.append(result[8])
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference = deltas
+            print(f"{label}: {calculator.nFormulas + calculator.nSolutions} products, {calculator.model.num_cols} columns, backend {backend}")
+
+        pairs = [(delta, best) for delta, best in zip(deltas, reference) if delta is not None and best is not None]
+        worse = sum(1 for delta, best in pairs if delta > best * (1 + WORSE_TOLERANCE) + 1e-6)
+        difference = max((delta - best) / max(best, 1e-6) for delta, best in pairs) if len(pairs) > 0 else 0.0
+        name = "all products" if k is None else f"K = {k}"
+        print(f"  {name:12} {1000 * seconds / len(targets):8.1f} ms/target  candidates: optimal {restricted[True] - len(gaps):3d}, "
+              f"feasible {len(gaps):3d} (largest gap {100 * max(gaps, default=0.0):5.2f}%)  all products {restricted[False]:3d}  "
+              f"worse {worse:3d}  largest difference {100 * difference:6.2f}%")
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+    n_products = int(sys.argv[2]) if len(sys.argv) > 2 else N_PRODUCTS
+    backend = sys.argv[3] if len(sys.argv) > 3 else BACKEND_AUTO
+    candidates = [int(k) for k in sys.argv[4:]] if len(sys.argv) > 4 else CANDIDATES
+    targets = random_targets(n_targets)
+
+    run("app's catalog", targets, backend, candidates)
+    with tempfile.TemporaryDirectory() as directory:
+        formulas_db, solutions_db = write_synthetic_catalog(directory, n_products)
+        run("synthetic catalog", targets, backend, candidates, formulas_db, solutions_db)
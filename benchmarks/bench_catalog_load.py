@@ -0,0 +1,145 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: loading of the catalog (parameters a, b, p, fmax, Vmin_list of MixCalculator)
+# A synthetic catalog of about 10,000 products is made from the shipped one (random copies of its products
+# with nutrient values changed by up to 20%). The nutrient matrix is built as before (one row at a time,
+# printing and parsing each row) and with DataFrame.to_numpy; then the catalog is compiled into binary arrays
+# and loaded with memory mapping, as MixCalculator does. Times are reported and values must be identical
+# Run from the repository root: python -m benchmarks.bench_catalog_load [number of products]
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import catalog
+
+
+N_PRODUCTS = 10000
+SEED = 2024
+
+# Columns of the databases that are not nutrient values
+TEXT_COLUMNS = ['Fornitore', 'Peso', 'NE, ONS, Polveri', 'Nome Prodotto', 'Descrizione', 'Caratteristiche Principali',
+                'Uso principale', 'Note', 'Prezzo', 'Volume', 'P/L/C (%)', 'Latt.', 'Nome', 'Volume flacone']
+
+
+# Write a database with n_rows random copies of the rows of source, nutrient values changed by up to 20%
+def write_synthetic_db(source, path, n_rows, rng):
+    with open(source, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        rows = list(reader)
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for k in range(n_rows):
+            row = dict(rng.choice(rows))
+            for field in fields:
+                if field not in TEXT_COLUMNS and row[field] != '':
+                    try:
+                        row[field] = round(float(row[field]) * rng.uniform(0.8, 1.2), 2)
+                    except ValueError:
+                        pass
+            name = 'Nome Prodotto' if 'Nome Prodotto' in row else 'Nome'
+            row[name] = f"{row[name]} {k}"
+            writer.writerow(row)
+
+
+# Write a synthetic catalog (formulas and solutions, in the same proportion as the shipped one) in directory
+# Returns the paths of the formulas' and solutions' databases
+def write_synthetic_catalog(directory, n_products, seed=SEED):
+    rng = random.Random(seed)
+    n_formulas = n_products * 2 // 3
+    formulas = os.path.join(directory, 'formulas.csv')
+    solutions = os.path.join(directory, 'solutions.csv')
+    write_synthetic_db(catalog.FORMULAS_DB, formulas, n_formulas, rng)
+    write_synthetic_db(catalog.SOLUTIONS_DB, solutions, n_products - n_formulas, rng)
+    return formulas, solutions
+
+
+# Previous loader of the nutrient matrix: each row is printed, cleaned and parsed back
+def old_nutrient_rows(df):
+    a = []
+    for i in range(len(df)):
+        row = df.iloc[[i]].values[0][0:]
+        row_string = str(row)[1:-1]
+        row_string = row_string.replace("\n", "")
+        nutrient_values_strings = row_string.strip().split()
+        nutrient_values = [float(x) for x in nutrient_values_strings]
+        a.append(nutrient_values)
+    return a
+
+
+# Nutrient values of a database as read by create_data (numeric columns except bottle volume and priority)
+def nutrient_frame(path):
+    df = pd.read_csv(path, encoding='utf-8')
+    df.columns = [c.lower().split(' ', 1)[0] for c in df.columns]
+    columns = ['kcal', 'prot.', 'lipidi', 'carbo', 'na', 'k', 'ca', 'mg', 'p', 'fe']
+    return df[columns].fillna(0)
+
+
+if __name__ == '__main__':
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else N_PRODUCTS
+
+    with tempfile.TemporaryDirectory() as directory:
+        formulas, solutions = write_synthetic_catalog(directory, n_products)
+        frames = [nutrient_frame(formulas), nutrient_frame(solutions)]
+
+        start = time.perf_counter()
+        a_old = old_nutrient_rows(frames[0]) + old_nutrient_rows(frames[1])
+        old_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        a_new = np.concatenate([frame.to_numpy(dtype=np.float64) for frame in frames])
+        new_seconds = time.perf_counter() - start
+
+        # compiled catalog: first load compiles the databases, next ones only map the arrays
+        start = time.perf_counter()
+        catalog.load_catalog(formulas, solutions)
+        compile_seconds = time.perf_counter() - start
+
+        loads = []
+        for k in range(10):
+            start = time.perf_counter()
+            data = catalog.load_catalog(formulas, solutions)
+            loads.append(time.perf_counter() - start)
+        a_compiled = np.array(data.a)
+
+        # a database changed: the catalog is compiled again
+        os.utime(solutions, ns=(0, 0))
+        start = time.perf_counter()
+        catalog.load_catalog(formulas, solutions)
+        touched_seconds = time.perf_counter() - start
+
+    print(f"{len(a_old)} products, {len(a_old[0])} nutrients")
+    print(f"nutrient matrix, row by row: {1000 * old_seconds:.1f} ms")
+    print(f"nutrient matrix, to_numpy:   {1000 * new_seconds:.1f} ms ({old_seconds / new_seconds:.0f} times faster)")
+    print(f"catalog compilation (read csv, write arrays): {1000 * compile_seconds:.1f} ms")
+    print(f"compiled catalog load (memory mapped): {1e6 * min(loads):.0f} us (median {1e6 * sorted(loads)[len(loads) // 2]:.0f} us)")
+    print(f"load after a database was touched (content unchanged, hash checked): {1000 * touched_seconds:.1f} ms")
+
+    assert np.array_equal(np.array(a_old), a_new), "Nutrient values differ between old and new loader"
+    assert np.array_equal(a_compiled, a_new), "Nutrient values of compiled catalog differ from the databases'"
+    print("OK: nutrient values identical")
@@ -0,0 +1,83 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark: per-solve latency of a new MixCalculator for every solve (cold)
+# versus one MixCalculator reused for every solve (warm)
+# Run from the repository root: python -m benchmarks.bench_engine
+
+import statistics
+import time
+
+import constants
+from mix_calculator import MixCalculator
+from nutrients_calculator import calculate_nutrients
+
+
+# Patients (weight, height, age, gender) used as targets
+PATIENTS = [
+    (50, 155, 30, "F"), (62, 160, 45, "F"), (75, 170, 60, "M"), (88, 178, 70, "M"),
+    (95, 182, 40, "M"), (58, 150, 80, "F"), (110, 190, 55, "M"), (68, 165, 25, "F"),
+]
+
+# Model parameters (Mmax, Cmax, Vmin, Smax, Dmax) cycled across solves
+PARAMS = [
+    (constants.DEFAULT_MMAX, constants.DEFAULT_CMAX, constants.DEFAULT_VMIN, 3000, 3000),
+    (3, 3, 50, 2000, 2000),
+    (2, 4, 100, 1500, 3000),
+]
+
+REPEATS = 3
+
+
+# Solve every target building a new MixCalculator each time
+def run_cold(targets):
+    times = []
+    for (nutrients, weights), params in targets:
+        start = time.perf_counter()
+        calculator = MixCalculator(*params)
+        calculator.model.verbose = 0
+        calculator.solve(nutrients, weights)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+# Solve every target with the same MixCalculator, changing only parameters and target
+def run_warm(targets):
+    calculator = MixCalculator(*targets[0][1])
+    calculator.model.verbose = 0
+    times = []
+    for (nutrients, weights), params in targets:
+        start = time.perf_counter()
+        calculator.set_params(*params)
+        calculator.solve(nutrients, weights)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def print_times(title, times):
+    print(f"{title}: mean = {statistics.mean(times)*1000:.1f} ms, median = {statistics.median(times)*1000:.1f} ms, max = {max(times)*1000:.1f} ms ({len(times)} solves)")
+
+
+if __name__ == '__main__':
+    weights = [float(w) for w in constants.DEFAULT_WEIGHTS]
+    targets = []
+    for r in range(REPEATS):
+        for i, patient in enumerate(PATIENTS):
+            targets.append(((calculate_nutrients(*patient), weights), PARAMS[(i + r) % len(PARAMS)]))
+
+    print_times("cold", run_cold(targets))
+    print_times("warm", run_warm(targets))
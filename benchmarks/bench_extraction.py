@@ -0,0 +1,81 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: extraction of results after a solve
+# Compares the previous extraction (a lookup by name of each variable, then one read per variable)
+# with MixCalculator.get_results (all values of the solution read in one call, products used selected in bulk),
+# on a synthetic catalog (see bench_catalog_load.py)
+# Run from the repository root: python -m benchmarks.bench_extraction [products in synthetic catalog] [repetitions]
+
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_catalog_load import write_synthetic_catalog
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import MixCalculator
+
+
+N_PRODUCTS = 5000
+REPETITIONS = 20
+MAX_SECONDS = 30
+
+
+# Extraction as done before get_results read the solution in bulk (results only)
+def extract_by_name(calculator):
+    model = calculator.model
+    objectives = [model.var_by_name('delta').x, model.var_by_name('s').x, model.var_by_name('d').x]
+    used = []
+    for i in range(calculator.nFormulas + calculator.nSolutions):
+        quantity = model.var_by_name("x({})".format(i)).x
+        number = model.var_by_name("f({})".format(i)).x
+        if quantity > 0:
+            used.append((i, quantity, number))
+    nutrients = [model.var_by_name('n({})'.format(j)).x for j in calculator.N]
+    total_volume = model.var_by_name('V').x
+    return objectives, used, nutrients, total_volume
+
+
+def timed(function, repetitions):
+    start = time.perf_counter()
+    for k in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions
+
+
+if __name__ == '__main__':
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else N_PRODUCTS
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else REPETITIONS
+
+    with tempfile.TemporaryDirectory() as directory:
+        formulas_db, solutions_db = write_synthetic_catalog(directory, n_products)
+        calculator = MixCalculator(max_seconds=MAX_SECONDS, formulas_db=formulas_db, solutions_db=solutions_db)
+        calculator.model.verbose = 0
+        print(f"model: {calculator.nFormulas + calculator.nSolutions} products, {calculator.model.num_rows} rows, {calculator.model.num_cols} columns")
+
+        nutrients, weights = random_targets(1)[0]
+        calculator.solve(nutrients, weights)
+        print(f"status: {calculator.status.name}, delta = {calculator.objectives[0]:.6f}")
+
+        objectives, used, values, total_volume = extract_by_name(calculator)
+        assert objectives == calculator.objectives and values == calculator.nutrients and total_volume == calculator.total_volume, "Different results"
+
+        by_name = timed(lambda: extract_by_name(calculator), repetitions)
+        bulk = timed(calculator.get_results, repetitions)
+        print(f"extraction by name: {1000 * by_name:.2f} ms")
+        print(f"bulk extraction:    {1000 * bulk:.2f} ms ({by_name / bulk:.0f}x faster)")
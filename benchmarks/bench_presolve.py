@@ -0,0 +1,66 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: presolve of the catalog (see presolve.py)
+# Reports how much the model shrinks, solve time with and without presolve on random targets,
+# and how results compare (CBC's heuristics may stop at slightly different mixes on the two models)
+# Run from the repository root: python -m benchmarks.bench_presolve [number of targets]
+
+import sys
+import time
+
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import MixCalculator
+
+
+N_TARGETS = 300
+
+
+def new_calculator(presolve):
+    calculator = MixCalculator(presolve=presolve)
+    calculator.model.verbose = 0
+    return calculator
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+
+    full = new_calculator(False)
+    reduced = new_calculator(True)
+    print(f"products: {full.nFormulas} formulas, {full.nSolutions} solutions -> {reduced.nFormulas} formulas, {reduced.nSolutions} solutions")
+    print(f"model: {full.model.num_rows} rows, {full.model.num_cols} columns -> {reduced.model.num_rows} rows, {reduced.model.num_cols} columns")
+    for chain in reduced.symmetry_chains:
+        print("identical: " + ", ".join(reduced.product_names[reduced.products[i]] for i in chain))
+
+    seconds = {False: 0.0, True: 0.0}
+    deltas = {False: [], True: []}
+    for nutrients, weights in random_targets(n_targets):
+        for presolve, calculator in ((False, full), (True, reduced)):
+            start = time.perf_counter()
+            deltas[presolve].append(calculator.solve(nutrients, weights)[0][0])
+            seconds[presolve] += time.perf_counter() - start
+
+    print(f"solve without presolve: {1000 * seconds[False] / n_targets:.1f} ms per target")
+    print(f"solve with presolve:    {1000 * seconds[True] / n_targets:.1f} ms per target ({100 * (1 - seconds[True] / seconds[False]):.0f}% saved)")
+
+    pairs = [(f, r) for f, r in zip(deltas[False], deltas[True]) if f is not None and r is not None]
+    assert len(pairs) == len([f for f in deltas[False] if f is not None]) == len([r for r in deltas[True] if r is not None]), "Presolve changed feasibility of a target"
+    worse = [r - f for f, r in pairs if r > f + 1e-9]
+    better = [f - r for f, r in pairs if f > r + 1e-9]
+    print(f"delta with presolve: worse on {len(worse)} targets (max {max(worse, default=0.0):.2e}), better on {len(better)} (max {max(better, default=0.0):.2e})")
+    print(f"mean delta: {sum(f for f, r in pairs) / len(pairs):.6f} without presolve, {sum(r for f, r in pairs) / len(pairs):.6f} with presolve")
@@ -0,0 +1,92 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: multi-day regimen (regimen_planner.py) against each day solved on its own
+# Targets of each day come from calculate_nutrients, with the patient's weight decreasing (rounded to kg, so some days repeat)
+# - daily: each day on its own (bottles opened each day, leftovers thrown away)
+# - regimen: one plan for all days, with products of each day from the daily mixes, then with full search
+# - rolling: the plan is made again after each day (carrying over open bottles, reusing unchanged days),
+#   against planning the remaining days from scratch each day
+# Reports time, worst deviation, formula waste and bottles opened
+# Run from the repository root: python -m benchmarks.bench_regimen [number of days] [hang time in hours]
+
+import sys
+import time
+
+import constants
+from nutrients_calculator import calculate_nutrients
+from regimen_planner import RegimenPlanner
+
+
+N_DAYS = 7
+HANG_HOURS = 48
+WEIGHT = 80.0       # kg on day 0
+WEIGHT_LOSS = 0.5   # kg per day
+
+
+def regimen_targets(n_days):
+    weights = [float(w) for w in constants.DEFAULT_WEIGHTS]
+    return [(calculate_nutrients(round(WEIGHT - WEIGHT_LOSS * day), 175, 60, "M"), weights) for day in range(n_days)]
+
+
+def report(label, seconds, results, waste, bottles):
+    deltas = [result[0][0] for result in results if result[0][0] is not None]
+    print(f"{label:16} {seconds:7.2f} s  worst delta {max(deltas):.4f}  waste {waste:7.0f} mL  bottles {bottles:4d}  days without mix {len(results) - len(deltas)}")
+
+
+if __name__ == '__main__':
+    n_days = int(sys.argv[1]) if len(sys.argv) > 1 else N_DAYS
+    hang_hours = float(sys.argv[2]) if len(sys.argv) > 2 else HANG_HOURS
+    targets = regimen_targets(n_days)
+
+    planner = RegimenPlanner(hang_hours=hang_hours)
+    start = time.perf_counter()
+    results = [planner.calculator.solve(nutrients, weights) for nutrients, weights in targets]
+    seconds = time.perf_counter() - start
+    waste = sum(result[0][1] for result in results if result[0][1] is not None)
+    bottles = sum(round(component[2]) for result in results for component in result[3] + result[4])
+    report("daily", seconds, results, waste, bottles)
+
+    for label, full_search in (("regimen", False), ("regimen (full)", True)):
+        planner = RegimenPlanner(hang_hours=hang_hours, full_search=full_search)
+        start = time.perf_counter()
+        results = planner.plan(targets)
+        seconds = time.perf_counter() - start
+        report(label, seconds, results, planner.waste, sum(number for day in planner.bottles for name, number, bottle in day))
+        print(f"{'':16} stages: " + ", ".join(f"{seconds:.2f} s" for seconds in planner.stage_seconds) + f" ({planner.status.name})")
+
+    # each day, plan the remaining days: rolling from the previous plan, or from scratch (with the same volume carried over)
+    planner = RegimenPlanner(hang_hours=hang_hours)
+    scratch = RegimenPlanner(hang_hours=hang_hours)
+    planner.plan(targets)
+    rolling_seconds = [0.0, 0.0]
+    scratch_seconds = [0.0, 0.0]
+    for day in range(1, n_days - 1):
+        start = time.perf_counter()
+        planner.roll()
+        rolling_seconds[0] += planner.stage_seconds[0]
+        rolling_seconds[1] += time.perf_counter() - start - planner.stage_seconds[0]
+        rolling_waste = planner.waste
+
+        start = time.perf_counter()
+        scratch.plan(targets[day:], planner.carried)
+        scratch_seconds[0] += scratch.stage_seconds[0]
+        scratch_seconds[1] += time.perf_counter() - start - scratch.stage_seconds[0]
+        print(f"day {day}: remaining waste rolling {rolling_waste:7.0f} mL ({planner.status.name}), from scratch {scratch.waste:7.0f} mL ({scratch.status.name})")
+    print(f"rolling:      separate solves {rolling_seconds[0]:6.2f} s  plans {rolling_seconds[1]:6.2f} s")
+    print(f"from scratch: separate solves {scratch_seconds[0]:6.2f} s  plans {scratch_seconds[1]:6.2f} s")
@@ -0,0 +1,93 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmark: start-up time of the graphical interface (time to first frame)
+# Each run starts a new interpreter with python -X importtime, creates the main window and draws it once.
+# Without a display, only the import of main is measured.
+# Fails if pandas or mip are imported before the first frame, or if the median time exceeds --max-ms
+# Run from the repository root: python -m benchmarks.bench_startup [--runs N] [--max-ms MS]
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+# Modules that must not be loaded before the first frame
+HEAVY_MODULES = ["pandas", "mip", "numpy"]
+
+# Code run in the new interpreter: prints time to first frame in ms and whether a frame was drawn
+CHILD = """
+import time
+start = time.perf_counter()
+import main
+frame = True
+try:
+    app = main.App()
+    app.update()
+except Exception:
+    frame = False
+print(round((time.perf_counter() - start) * 1000, 3), frame)
+"""
+
+
+# Run the child interpreter once
+# Return time to first frame [ms], whether a frame was drawn, top-level imports [ms] by module, all imported modules
+def run_once():
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], capture_output=True, text=True, check=True)
+    elapsed, frame = process.stdout.split()
+
+    imports = {}
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue        # header
+        name = fields[2].rstrip()
+        modules.add(name.strip().split(".")[0])
+        if not name.startswith("  "):
+            imports[name.strip()] = int(fields[1]) / 1000      # cumulative time in ms
+    return float(elapsed), frame == "True", imports, modules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if median time to first frame is above this value")
+    args = parser.parse_args()
+
+    times = []
+    for r in range(args.runs):
+        elapsed, frame, imports, modules = run_once()
+        times.append(elapsed)
+
+    median = statistics.median(times)
+    what = "time to first frame" if frame else "import of main (no display)"
+    print(f"{what}: median = {median:.1f} ms, min = {min(times):.1f} ms, max = {max(times):.1f} ms ({args.runs} runs)")
+    print("slowest top-level imports: " + ", ".join(f"{name} {t:.1f} ms" for name, t in sorted(imports.items(), key=lambda item: -item[1])[:5]))
+
+    failed = False
+    loaded = [m for m in HEAVY_MODULES if m in modules]
+    if loaded:
+        print("FAIL: modules imported before the first frame: " + ", ".join(loaded))
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median above {args.max_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
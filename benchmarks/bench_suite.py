@@ -0,0 +1,215 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark suite: reproducible corpus of ICU patients solved on synthetic catalogs of growing size
+# Patients (weight, height, age, gender) are drawn with a fixed seed within the ranges of constants.py, their targets are
+# calculated with calculate_nutrients, nutrients' weights are drawn from VALID_WEIGHTS and parameters (Mmax, Cmax, Vmin)
+# go through a grid. Each scale multiplies the number of products of the app's catalog (synthetic copies, see bench_catalog_load.py)
+# and reports: catalog loading (first load compiling the databases, then a load of the compiled catalog as on a restart),
+# model building, then for each solve the time of its phases and solver's statistics (see solve_metrics.py),
+# and the throughput of batch_solver.solve_batch on the same targets.
+# Results are written as JSON (standard output or --output), with the commit they were measured on;
+# --compare reads the results of a previous run and prints the ratio of the main times (new / old)
+# Run from the repository root: python -m benchmarks.bench_suite [--scales 1 10 100] [--output FILE] [--compare FILE]
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import catalog
+import constants
+from batch_solver import solve_batch
+from benchmarks.bench_catalog_load import write_synthetic_catalog
+from mix_calculator import MixCalculator
+from nutrients_calculator import calculate_nutrients
+
+
+SEED = 2024
+SCALES = [1, 10, 100]
+# Targets solved at each scale (the first ones of the same corpus, so that scales can be compared)
+N_TARGETS = {1: 54, 10: 27, 100: 6}
+N_TARGETS_DEFAULT = 6
+MAX_SECONDS = constants.DEFAULT_MAX_SECONDS
+
+# Grid of parameters, each target takes the next point of the grid
+MMAX_GRID = [1, 3, 5]
+CMAX_GRID = [1, 3, 5]
+VMIN_GRID = [10, 50, 100]
+
+# Phases of a solve summarised in the results (fields of SolveMetrics)
+PHASES = ["set_target_seconds", "optimize_seconds", "extraction_seconds", "total_seconds"]
+
+# Times compared with --compare: (name, function of a scale's results)
+COMPARED = [("catalog compile", lambda r: r["catalog_compile_seconds"]),
+            ("catalog load", lambda r: r["catalog_seconds"]),
+            ("model build", lambda r: r["build_seconds"]),
+            ("solve median", lambda r: r["phases"]["optimize_seconds"]["median"]),
+            ("solve p95", lambda r: r["phases"]["optimize_seconds"]["p95"]),
+            ("extraction median", lambda r: r["phases"]["extraction_seconds"]["median"]),
+            ("batch", lambda r: r["batch"]["seconds"])]
+
+
+# Parameters (Mmax, Cmax, Vmin, Smax, Dmax) of the grid, Smax and Dmax as the app's defaults for Mmax
+def params_grid():
+    return [(Mmax, Cmax, Vmin, Mmax * 500 + 500, Mmax * 500 + 500) for Mmax in MMAX_GRID for Cmax in CMAX_GRID for Vmin in VMIN_GRID]
+
+
+# Corpus of n_targets patients: list of (patient, nutrients, weights, params), patient = (weight, height, age, gender)
+# The same seed always gives the same corpus, and a longer corpus starts with the same targets
+def patient_corpus(n_targets, seed=SEED):
+    rng = random.Random(seed)
+    grid = params_grid()
+    corpus = []
+    for t in range(n_targets):
+        patient = (round(rng.uniform(constants.WEIGHT_MIN, constants.WEIGHT_MAX), 1), rng.randint(constants.HEIGHT_MIN, constants.HEIGHT_MAX),
+                   rng.randint(constants.AGE_MIN, constants.AGE_MAX_ACTUAL), rng.choice(["M", "F"]))
+        nutrients = calculate_nutrients(*patient)
+        weights = [float(rng.choice(constants.VALID_WEIGHTS)) for j in range(len(nutrients))]
+        corpus.append((patient, nutrients, weights, grid[t % len(grid)]))
+    return corpus
+
+
+# Number of products of the app's catalog
+def app_products():
+    return len(pd.read_csv(catalog.FORMULAS_DB)) + len(pd.read_csv(catalog.SOLUTIONS_DB))
+
+
+# Mean, median, 95th percentile, max and sum of a list of values
+def summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return None
+    return {"mean": float(values.mean()), "median": float(np.median(values)), "p95": float(np.percentile(values, 95)),
+            "max": float(values.max()), "sum": float(values.sum())}
+
+
+# Count of each value
+def counts(values):
+    result = {}
+    for value in values:
+        result[str(value)] = result.get(str(value), 0) + 1
+    return result
+
+
+# Solve the corpus on a synthetic catalog of scale times the app's products, one solve at a time and then in batch
+def run_scale(scale, corpus, max_seconds, workers):
+    with tempfile.TemporaryDirectory() as directory:
+        n_products = scale * app_products()
+        formulas_db, solutions_db = write_synthetic_catalog(directory, n_products)
+
+        # first load compiles the databases, the second one loads the compiled catalog (as when the app starts again)
+        calculator = MixCalculator(*corpus[0][3], max_seconds=max_seconds, formulas_db=formulas_db, solutions_db=solutions_db)
+        catalog_compile_seconds = calculator.catalog_seconds
+        catalog.loaded_catalogs.clear()
+        calculator = MixCalculator(*corpus[0][3], max_seconds=max_seconds, formulas_db=formulas_db, solutions_db=solutions_db)
+        calculator.model.verbose = 0
+
+        solves = []
+        deltas = []
+        for case, (patient, nutrients, weights, params) in enumerate(corpus):
+            calculator.set_params(*params)
+            result = calculator.solve(nutrients, weights)
+            deltas.append(result[0][0])
+            solves.append(dict(calculator.metrics.to_dict(), case=case))
+
+        start = time.perf_counter()
+        results = solve_batch([(nutrients, weights, params) for patient, nutrients, weights, params in corpus], workers=workers, max_seconds=max_seconds,
+                              formulas_db=formulas_db, solutions_db=solutions_db)
+        batch_seconds = time.perf_counter() - start
+
+        # products: in the catalog, model_products: left in the model by presolve
+        return {"scale": scale, "products": n_products, "model_products": calculator.nFormulas + calculator.nSolutions, "rows": calculator.model.num_rows,
+                "columns": calculator.model.num_cols, "targets": len(corpus),
+                "catalog_compile_seconds": catalog_compile_seconds, "catalog_seconds": calculator.catalog_seconds, "build_seconds": calculator.build_seconds,
+                "phases": {phase: summary([solve[phase] for solve in solves]) for phase in PHASES},
+                "nodes": sum(solve["nodes"] for solve in solves), "iterations": sum(solve["iterations"] for solve in solves),
+                "status": counts(solve["status"] for solve in solves), "backends": counts(solve["backend"] for solve in solves),
+                "mean_delta": float(np.mean([delta for delta in deltas if delta is not None])) if any(delta is not None for delta in deltas) else None,
+                "batch": {"workers": workers, "seconds": batch_seconds, "targets_per_second": len(corpus) / batch_seconds,
+                          "same_deltas": [r[0][0] for r in results] == deltas},
+                "solves": solves}
+
+
+# Commit of the working tree, None outside a git repository
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(results, file):
+    for r in results["scales"]:
+        solve = r["phases"]["optimize_seconds"]
+        print(f"x{r['scale']:<4} {r['products']:6d} products ({r['model_products']:5d} in model) {r['columns']:6d} columns  catalog {1000 * r['catalog_compile_seconds']:8.1f} ms "
+              f"(compiled {1000 * r['catalog_seconds']:6.1f} ms)  model {1000 * r['build_seconds']:8.1f} ms  "
+              f"solve median {1000 * solve['median']:8.1f} ms p95 {1000 * solve['p95']:8.1f} ms  "
+              f"extraction {1000 * r['phases']['extraction_seconds']['median']:5.2f} ms  "
+              f"batch {r['batch']['targets_per_second']:7.2f} targets/s  {r['status']}", file=file)
+
+
+# Print ratios new / old of the times in COMPARED, for the scales in both results
+def print_comparison(old, new, file):
+    print(f"compared with {old.get('commit')} (ratio new / old, < 1 is faster)", file=file)
+    old_scales = {r["scale"]: r for r in old["scales"]}
+    for r in new["scales"]:
+        if r["scale"] not in old_scales or old_scales[r["scale"]]["targets"] != r["targets"]:
+            print(f"x{r['scale']}: not in the old results, or with other targets", file=file)
+            continue
+        ratios = [f"{name} {value(r) / value(old_scales[r['scale']]):.2f}" for name, value in COMPARED if value(old_scales[r["scale"]]) > 0]
+        print(f"x{r['scale']:<4} " + ", ".join(ratios), file=file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="bench_suite", description="Benchmark suite on a reproducible corpus of patients.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="multiples of the app's number of products in the synthetic catalogs")
+    parser.add_argument("--targets", type=int, default=None, help="targets of each scale (default: " + ", ".join(f"{n} for x{s}" for s, n in N_TARGETS.items()) + ")")
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="time limit for each target [s]")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes of the batch")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the corpus")
+    parser.add_argument("--output", default=None, metavar="FILE", help="write results to this file instead of standard output")
+    parser.add_argument("--compare", default=None, metavar="FILE", help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = {"commit": current_commit(), "time": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+               "cpus": os.cpu_count(), "seed": args.seed, "max_seconds": args.max_seconds,
+               "grid": {"Mmax": MMAX_GRID, "Cmax": CMAX_GRID, "Vmin": VMIN_GRID}, "scales": []}
+    for scale in args.scales:
+        n_targets = args.targets if args.targets is not None else N_TARGETS.get(scale, N_TARGETS_DEFAULT)
+        results["scales"].append(run_scale(scale, patient_corpus(n_targets, args.seed), args.max_seconds, args.workers))
+        print_summary({"scales": results["scales"][-1:]}, sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), results, sys.stderr)
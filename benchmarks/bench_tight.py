@@ -0,0 +1,81 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: tighter formulation of the model (MixCalculator(tight=True), see create_model)
+# Reports model size, solve time, branch-and-bound nodes (of backend cbc) and results with and without the tighter formulation,
+# on the app's catalog and optionally on a larger synthetic catalog (where some targets need a real search)
+# Run from the repository root: python -m benchmarks.bench_tight [number of targets] [products in synthetic catalog] [max seconds]
+
+import sys
+import tempfile
+import time
+
+from mip import OptimizationStatus
+
+from benchmarks.bench_catalog_load import write_synthetic_catalog
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import BACKEND_CBC, MixCalculator
+
+
+N_TARGETS = 300
+MAX_SECONDS = 20
+
+
+def new_calculator(tight, max_seconds, formulas_db=None, solutions_db=None):
+    calculator = MixCalculator(max_seconds=max_seconds, formulas_db=formulas_db, solutions_db=solutions_db, tight=tight, backend=BACKEND_CBC)
+    calculator.model.verbose = 0
+    return calculator
+
+
+def compare(n_targets, max_seconds, formulas_db=None, solutions_db=None):
+    calculators = {tight: new_calculator(tight, max_seconds, formulas_db, solutions_db) for tight in (False, True)}
+    for tight, calculator in calculators.items():
+        print(f"tight={tight}: {calculator.model.num_rows} rows, {calculator.model.num_cols} columns")
+
+    seconds = {False: 0.0, True: 0.0}
+    nodes = {False: 0, True: 0}
+    stopped = {False: 0, True: 0}
+    deltas = {False: [], True: []}
+    for nutrients, weights in random_targets(n_targets):
+        for tight, calculator in calculators.items():
+            start = time.perf_counter()
+            result = calculator.solve(nutrients, weights)
+            seconds[tight] += time.perf_counter() - start
+            nodes[tight] += calculator.search_stats()[0]
+            stopped[tight] += result[7] == OptimizationStatus.FEASIBLE
+            deltas[tight].append(result[0][0])
+
+    for tight in (False, True):
+        print(f"tight={tight}: {1000 * seconds[tight] / n_targets:.1f} ms per target, {nodes[tight]} nodes, {stopped[tight]} targets stopped by time limit")
+    pairs = [(l, t) for l, t in zip(deltas[False], deltas[True]) if l is not None and t is not None]
+    worse = [t - l for l, t in pairs if t > l + 1e-9]
+    better = [l - t for l, t in pairs if l > t + 1e-9]
+    print(f"delta with tight formulation: worse on {len(worse)} targets (max {max(worse, default=0.0):.2e}), better on {len(better)} (max {max(better, default=0.0):.2e})")
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+    n_products = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    max_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else MAX_SECONDS
+
+    print("app's catalog")
+    compare(n_targets, max_seconds)
+    if n_products > 0:
+        print(f"synthetic catalog, {n_products} products")
+        with tempfile.TemporaryDirectory() as directory:
+            compare(n_targets, max_seconds, *write_synthetic_catalog(directory, n_products))
@@ -0,0 +1,79 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: ward mode (ward_calculator.py) against patients solved separately
+# - separately: each patient on their own, ignoring that stock is shared (bottles may exceed stock)
+# - in turn: each patient on their own, taking bottles from the shared stock (the last ones get what is left)
+# - ward: one model for all patients, sharing bottles and stock (products of each patient from stage 1, then with full search)
+# Reports time, worst and total deviation, formula waste and bottles opened
+# Run from the repository root: python -m benchmarks.bench_ward [number of patients] [objective: max or sum]
+
+import sys
+import time
+
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import MixCalculator
+from ward_calculator import MAX_DELTA, WardCalculator
+
+
+N_PATIENTS = 30
+MAX_SECONDS = 60
+
+
+def report(label, seconds, results, waste, bottles):
+    deltas = [result[0][0] for result in results if result[0][0] is not None]
+    print(f"{label:12} {seconds:7.2f} s  worst delta {max(deltas):.4f}  total delta {sum(deltas):.4f}  "
+          f"waste {max(waste, 0.0):7.0f} mL  bottles {bottles:4d}  patients without mix {len(results) - len(deltas)}")
+
+
+if __name__ == '__main__':
+    n_patients = int(sys.argv[1]) if len(sys.argv) > 1 else N_PATIENTS
+    objective = sys.argv[2] if len(sys.argv) > 2 else MAX_DELTA
+    targets = random_targets(n_patients)
+
+    calculator = MixCalculator(max_seconds=MAX_SECONDS)
+    calculator.model.verbose = 0
+    stock = calculator.product_fmax.copy()
+
+    start = time.perf_counter()
+    results = [calculator.solve(nutrients, weights) for nutrients, weights in targets]
+    seconds = time.perf_counter() - start
+    waste = sum(result[0][1] for result in results if result[0][1] is not None)
+    bottles = sum(round(component[2]) for result in results for component in result[3] + result[4])
+    report("separately", seconds, results, waste, bottles)
+
+    start = time.perf_counter()
+    results = []
+    left = stock.copy()
+    for nutrients, weights in targets:
+        calculator.set_stock(left)
+        results.append(calculator.solve(nutrients, weights))
+        if calculator.status.name in ("OPTIMAL", "FEASIBLE"):
+            for k, number in calculator.bottles_used:
+                left[k] -= number
+    seconds = time.perf_counter() - start
+    waste = sum(result[0][1] for result in results if result[0][1] is not None)
+    report("in turn", seconds, results, waste, int((stock - left).sum()))
+
+    for label, full_search in (("ward", False), ("ward (full)", True)):
+        ward = WardCalculator(objective=objective, full_search=full_search, max_seconds=MAX_SECONDS)
+        start = time.perf_counter()
+        results = ward.solve(targets)
+        seconds = time.perf_counter() - start
+        report(label, seconds, results, ward.waste, sum(number for name, number, bottle in ward.bottles))
+        print(f"{'':12} stages: " + ", ".join(f"{seconds:.2f} s" for seconds in ward.stage_seconds) + f" ({ward.status.name})")
@@ -0,0 +1,87 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Benchmark: warm start from the nearest previous target
+# A scripted sequence of nudged targets (a weight moved by +/- 0.1, or a nutrient changed by up to 10%,
+# as the user does with the app's buttons) is solved with and without warm start
+# Reports wall time and branch and bound nodes (of backend cbc), and how much warm started results differ from cold ones
+# Run from the repository root: python -m benchmarks.bench_warm_start [number of patients] [nudges per patient]
+
+import random
+import sys
+import time
+
+from benchmarks.check_target_swap import random_targets
+from mix_calculator import BACKEND_CBC, MixCalculator
+
+
+N_PATIENTS = 20
+N_NUDGES = 9
+SEED = 2024
+
+
+# Each patient's target followed by its nudged versions (each nudge changes the previous target)
+def nudged_targets(n_patients, n_nudges, seed=SEED):
+    rng = random.Random(seed)
+    targets = []
+    for nutrients, weights in random_targets(n_patients, seed):
+        targets.append((nutrients, weights))
+        for k in range(n_nudges):
+            nutrients = list(nutrients)
+            weights = list(weights)
+            j = rng.randrange(len(nutrients))
+            if rng.random() < 0.5:
+                weights[j] = round(min(max(weights[j] + rng.choice([-0.1, 0.1]), 0.0), 1.0), 1)
+            else:
+                nutrients[j] = nutrients[j] * rng.uniform(0.9, 1.1)
+            targets.append((nutrients, weights))
+    return targets
+
+
+# Solve all targets in sequence on one MixCalculator, return deltas, total solve time and total nodes
+def run(targets, warm_start):
+    calculator = MixCalculator(warm_start=warm_start, backend=BACKEND_CBC)
+    calculator.model.verbose = 0
+
+    deltas = []
+    seconds = 0.0
+    nodes = 0
+    for nutrients, weights in targets:
+        start = time.perf_counter()
+        deltas.append(calculator.solve(nutrients, weights)[0][0])
+        seconds += time.perf_counter() - start
+        nodes += calculator.search_stats()[0]
+    return deltas, seconds, nodes
+
+
+if __name__ == '__main__':
+    n_patients = int(sys.argv[1]) if len(sys.argv) > 1 else N_PATIENTS
+    n_nudges = int(sys.argv[2]) if len(sys.argv) > 2 else N_NUDGES
+    targets = nudged_targets(n_patients, n_nudges)
+
+    cold, cold_seconds, cold_nodes = run(targets, False)
+    warm, warm_seconds, warm_nodes = run(targets, True)
+
+    print(f"{len(targets)} targets ({n_patients} patients, {n_nudges} nudges each)")
+    print(f"cold start: {cold_seconds:.2f} s ({1000 * cold_seconds / len(targets):.1f} ms per solve), {cold_nodes} nodes")
+    print(f"warm start: {warm_seconds:.2f} s ({1000 * warm_seconds / len(targets):.1f} ms per solve), {warm_nodes} nodes")
+
+    differences = [(w - c) / c for c, w in zip(cold, warm) if c is not None and w is not None and c > 0]
+    worse = [d for d in differences if d > 1e-9]
+    better = [d for d in differences if d < -1e-9]
+    print(f"warm start delta worse than cold on {len(worse)} targets (max {max(worse, default=0.0):.2e} relative), better on {len(better)}")
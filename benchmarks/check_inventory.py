@@ -0,0 +1,80 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Regression check: stock from the inventory (see inventory.py)
+# - after random changes of stock, a MixCalculator updated in place gives the same results as a new one,
+#   its model keeps the same size and out-of-stock products are not used
+# - a ward plan solved by several processes takes from the inventory exactly the bottles of its mixes
+# Run from the repository root: python -m benchmarks.check_inventory [number of targets] [workers]
+
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+
+from batch_solver import solve_batch
+from benchmarks.check_target_swap import TOLERANCE, random_targets
+from inventory import Inventory
+from mix_calculator import MixCalculator
+
+
+N_TARGETS = 24
+WORKERS = 3
+STOCK = 6
+SEED = 2024
+
+
+def new_calculator(inventory_db):
+    calculator = MixCalculator(inventory_db=inventory_db)
+    calculator.model.verbose = 0
+    return calculator
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    rng = random.Random(SEED)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "inventory.sqlite")
+        inventory = Inventory(path)
+        calculator = new_calculator(path)
+        keys = calculator.product_keys
+        size = (calculator.model.num_rows, calculator.model.num_cols)
+
+        for t, (nutrients, weights) in enumerate(random_targets(n_targets)):
+            inventory.set_stock({key: rng.choice([0, 0, 1, 2, 5, 10]) for key in rng.sample(keys, len(keys) // 3)})
+            delta = calculator.solve(nutrients, weights)[0][0]
+            assert (calculator.model.num_rows, calculator.model.num_cols) == size, f"Model size changed at target {t}"
+            stock = dict(zip(keys, inventory.get_stock(keys, calculator.fmax_default)))
+            for k, number in calculator.bottles_used:
+                assert number <= stock[keys[k]], f"Target {t}: {number} bottles of {keys[k]} used, {stock[keys[k]]} available"
+
+            delta_new = new_calculator(path).solve(nutrients, weights)[0][0]
+            assert (delta is None) == (delta_new is None) and (delta is None or abs(delta - delta_new) <= TOLERANCE), \
+                f"Target {t}: delta = {delta} with updated model, {delta_new} with new model"
+        print(f"OK: {n_targets} stock changes, model size constant ({size[0]} rows, {size[1]} columns), results equal to new models")
+
+        inventory.set_stock({key: STOCK for key in keys})
+        results = solve_batch([(nutrients, weights, None) for nutrients, weights in random_targets(n_targets)], workers=workers, inventory_db=path)
+        used = sum(round(component[2]) for result in results for component in result[3] + result[4])
+        taken = sum(STOCK - bottles for bottles in inventory.get_stock(keys, STOCK))
+        assert used == taken, f"{used} bottles in the mixes, {taken} taken from the inventory"
+        print(f"OK: ward plan of {n_targets} targets with {workers} processes, {taken} bottles taken {dict(Counter(result[7].name for result in results))}")
+        inventory.close()
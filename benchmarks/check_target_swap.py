@@ -0,0 +1,76 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression check: one MixCalculator solves many consecutive targets
+# - the number of rows and columns of the model must stay constant
+# - each result must match the one of a new MixCalculator solved on the same target
+# Run from the repository root: python -m benchmarks.check_target_swap [number of targets]
+
+import random
+import sys
+
+import constants
+from mix_calculator import MixCalculator
+from nutrients_calculator import calculate_nutrients
+
+
+N_TARGETS = 1000
+SEED = 2024
+TOLERANCE = 1e-9    # max difference between delta of reused and new model
+
+
+# Random targets: nutrients of random patients, with random weights
+def random_targets(n_targets, seed=SEED):
+    rng = random.Random(seed)
+    targets = []
+    for t in range(n_targets):
+        weight = rng.uniform(constants.WEIGHT_MIN, constants.WEIGHT_MAX)
+        height = rng.uniform(constants.HEIGHT_MIN, constants.HEIGHT_MAX)
+        age = rng.uniform(constants.AGE_MIN, constants.AGE_MAX_ACTUAL)
+        gender = rng.choice(["M", "F"])
+        nutrients = calculate_nutrients(weight, height, age, gender)
+
+        # some nutrients are not a target
+        for j in range(len(nutrients)):
+            if rng.random() < 0.2:
+                nutrients[j] = 0.0
+
+        weights = [float(rng.choice(constants.VALID_WEIGHTS[1:])) for j in range(len(nutrients))]
+        targets.append((nutrients, weights))
+    return targets
+
+
+def new_calculator():
+    calculator = MixCalculator()
+    calculator.model.verbose = 0
+    return calculator
+
+
+if __name__ == '__main__':
+    n_targets = int(sys.argv[1]) if len(sys.argv) > 1 else N_TARGETS
+
+    calculator = new_calculator()
+    size = (calculator.model.num_rows, calculator.model.num_cols)
+
+    for t, (nutrients, weights) in enumerate(random_targets(n_targets)):
+        delta = calculator.solve(nutrients, weights)[0][0]
+        assert (calculator.model.num_rows, calculator.model.num_cols) == size, f"Model size changed at target {t}: {(calculator.model.num_rows, calculator.model.num_cols)} instead of {size}"
+
+        delta_new = new_calculator().solve(nutrients, weights)[0][0]
+        assert abs(delta - delta_new) <= TOLERANCE, f"Target {t}: delta = {delta} with reused model, {delta_new} with new model"
+
+    print(f"OK: {n_targets} targets solved, model size constant ({size[0]} rows, {size[1]} columns), results equal to new models")
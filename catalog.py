@@ -0,0 +1,341 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Catalog of formulas and solutions
+# Columns of the databases (csv) are found through a declared schema (accepted names and units of each column),
+# values are validated, then compiled into binary arrays (NumPy .npy files, in directory "compiled" next to the
+# formulas' database) and loaded with memory mapping. Databases are read again only when they change
+# (modification time and size, then content's hash). Each process keeps the catalogs it loaded (get_catalog)
+# Each compilation is written in a new directory (named from the contents), then meta.json is switched to it:
+# files of a catalog still mapped by some process are never replaced (on Windows that fails)
+# When the databases are in a read-only location, the catalog is read from them and kept in memory by each process
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+# Directory of the app: default databases are found from here, not from the current directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Databases of formulas and solutions (nutrient values per 100ml)
+# Other databases can be used setting environment variables NUTRIOPTIMIX_FORMULAS_DB and NUTRIOPTIMIX_SOLUTIONS_DB
+SHIPPED_FORMULAS_DB = os.path.join(APP_DIR, 'Database', 'formulas.csv')
+FORMULAS_DB = os.environ.get('NUTRIOPTIMIX_FORMULAS_DB', SHIPPED_FORMULAS_DB)
+SOLUTIONS_DB = os.environ.get('NUTRIOPTIMIX_SOLUTIONS_DB', os.path.join(APP_DIR, 'Database', 'solutions.csv'))
+
+
+## Schema of the databases
+# Column names are compared ignoring case and repeated spaces
+
+# Nutrients, in the order used by the model and the app: key, unit (per 100ml), accepted column names
+# with the factor converting their values to the unit
+NUTRIENTS = [
+    ('energy', 'kcal', {'Kcal': 1.0, 'Energia (kcal)': 1.0, 'Energy (kcal)': 1.0, 'Energia (kJ)': 1 / 4.184, 'Energy (kJ)': 1 / 4.184}),
+    ('protein', 'g', {'Prot. gr.': 1.0, 'Proteine (g)': 1.0, 'Protein (g)': 1.0}),
+    ('fat', 'g', {'Lipidi gr.': 1.0, 'Lipidi (g)': 1.0, 'Fat (g)': 1.0}),
+    ('carbs', 'g', {'Carbo gr.': 1.0, 'Carboidrati (g)': 1.0, 'Carbohydrates (g)': 1.0}),
+    ('na', 'mg', {'Na (mg)': 1.0, 'Sodio (mg)': 1.0, 'Sodium (mg)': 1.0, 'Na (g)': 1000.0}),
+    ('k', 'mg', {'K (mg)': 1.0, 'Potassio (mg)': 1.0, 'Potassium (mg)': 1.0, 'K (g)': 1000.0}),
+    ('ca', 'mg', {'Ca (mg)': 1.0, 'Calcio (mg)': 1.0, 'Calcium (mg)': 1.0, 'Ca (g)': 1000.0}),
+    ('mg', 'mg', {'Mg (mg)': 1.0, 'Magnesio (mg)': 1.0, 'Magnesium (mg)': 1.0, 'Mg (g)': 1000.0}),
+    ('p', 'mg', {'P (mg)': 1.0, 'Fosforo (mg)': 1.0, 'Phosphorus (mg)': 1.0, 'P (g)': 1000.0}),
+    ('fe', 'mg', {'Fe (mg)': 1.0, 'Ferro (mg)': 1.0, 'Iron (mg)': 1.0, 'Fe (g)': 1000.0}),
+]
+
+# Product's name (required)
+NAME_COLUMNS = ['Nome Prodotto', 'Nome', 'Name', 'Product']
+
+# Bottle volume [ml] (required, empty cells use the default volume)
+VOLUME_COLUMNS = ['Volume', 'Volume flacone', 'Volume (ml)', 'Bottle volume (ml)']
+
+# Formula's priority level, between 0 (excluded) and 1 (optional, missing values use the default priority)
+PRIORITY_COLUMNS = ['Peso', 'Priorità', 'Priority']
+
+
+# Directory of compiled catalogs, next to the formulas' database
+COMPILED_DIR = 'compiled'
+COMPILED_VERSION = 3
+
+# Arrays of a compiled catalog
+ARRAYS = ['formula_names', 'solution_names', 'a', 'b', 'p']
+
+
+# Formulas and solutions data (read-only, shared by all the users of the catalog)
+# formula_names, solution_names : names
+# a : nutrient values per 100ml, in NUTRIENTS order (one row for each formula, then one for each solution; missing values are 0)
+# b : bottle volumes (formulas, then solutions), p : formulas' priority levels (missing values are NaN)
+# hash : hash of the databases' contents, sources : paths, modification times and sizes of the databases
+class Catalog():
+    def __init__(self, arrays, meta):
+        self.formula_names = tuple(np.asarray(arrays['formula_names']).tolist())
+        self.solution_names = tuple(np.asarray(arrays['solution_names']).tolist())
+        self.a = np.asarray(arrays['a'])
+        self.b = np.asarray(arrays['b'])
+        self.p = np.asarray(arrays['p'])
+        self.hash = meta['hash']
+        self.sources = meta['sources']
+
+
+# Hash of the databases' contents, identifies a catalog
+def catalog_hash(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+# Hash of the schema: compiled catalogs are rebuilt when the schema changes
+def schema_hash():
+    schema = repr((NUTRIENTS, NAME_COLUMNS, VOLUME_COLUMNS, PRIORITY_COLUMNS))
+    return hashlib.sha256(schema.encode('utf-8')).hexdigest()
+
+
+# Modification time and size of the databases (to detect changes without reading them)
+def sources_signature(paths):
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+# Column name compared ignoring case and repeated spaces (also non-breaking ones)
+def normalize_column(name):
+    return ' '.join(str(name).split()).lower()
+
+
+# Find the column of df with one of the accepted names, return its name in df (None if missing)
+def find_column(df, names, path, required=True):
+    columns = {normalize_column(c): c for c in df.columns}
+    for name in names:
+        if normalize_column(name) in columns:
+            return columns[normalize_column(name)]
+    assert not required, f"{path}: missing column, accepted names are {names}"
+    return None
+
+
+# Numeric values of column of df (empty cells are NaN), checking that all other cells are numbers
+def numeric_column(df, column, path):
+    import pandas as pd
+
+    values = pd.to_numeric(df[column], errors='coerce')
+    wrong = values.isna() & df[column].notna()
+    assert not wrong.any(), f"{path}: column '{column}' has values that are not numbers in rows {[i + 2 for i in np.flatnonzero(wrong.to_numpy())]}"
+    return values.to_numpy(dtype=np.float64)
+
+
+# Read and validate one database: return names, bottle volumes, nutrient values (NUTRIENTS order) and priority levels
+def read_database(path, priority):
+    import pandas as pd
+
+    df = pd.read_csv(path, encoding='utf-8', dtype=str, keep_default_na=False, na_values=[''])
+
+    # names
+    name_column = find_column(df, NAME_COLUMNS, path)
+    names = df[name_column]
+    assert names.notna().all(), f"{path}: missing product names in rows {[i + 2 for i in np.flatnonzero(names.isna().to_numpy())]}"
+    names = [str(n) for n in names]
+
+    # bottle volumes
+    volumes = numeric_column(df, find_column(df, VOLUME_COLUMNS, path), path)
+    assert not (volumes <= 0).any(), f"{path}: bottle volumes must be positive"
+
+    # nutrient values per 100ml, converted to the units of the schema
+    a = np.zeros((len(df), len(NUTRIENTS)), dtype=np.float64)
+    for j, (key, unit, columns) in enumerate(NUTRIENTS):
+        column = find_column(df, list(columns), path)
+        factor = columns[next(name for name in columns if normalize_column(name) == normalize_column(column))]
+        values = numeric_column(df, column, path)
+        assert not (values < 0).any(), f"{path}: values of column '{column}' must be non-negative"
+        a[:, j] = np.nan_to_num(values, nan=0.0) * factor
+
+    # priority levels
+    p = np.full(len(df), np.nan)
+    if priority:
+        column = find_column(df, PRIORITY_COLUMNS, path, required=False)
+        if column is not None:
+            p = numeric_column(df, column, path)
+            assert not ((p <= 0) | (p > 1)).any(), f"{path}: priority levels must be greater than 0 and at most 1"
+
+    # manage lactose
+    # if not okLactose:
+    #     if 'lactose' in df.columns:
+    #         df.lactose = df.lactose.str.lower()
+    #         df.lactose = df.lactose.fillna(True)  # with no data, assume formula may contain lactose
+    #         df.loc[df['lactose'] == 'no', 'lactose'] = False
+    #         df.loc[df['lactose'] == 'sì', 'lactose'] = True
+    #         df.loc[(df['lactose'] != False) & (df['lactose'] != True), 'lactose'] = True
+    #         df = df[(df.lactose == False)]        # keep lactose-free formulas only
+    #     else:
+    #         print("Warning: Missing data about lactose in formulas. Continued solving with all formulas\n")
+
+    return names, volumes, a, p
+
+
+# Read and validate the databases (csv) into the arrays of a catalog
+def read_databases(formulas_path, solutions_path):
+    formula_names, b_formulas, a_formulas, p = read_database(formulas_path, True)
+    solution_names, b_solutions, a_solutions, p_solutions = read_database(solutions_path, False)
+
+    return {'formula_names': np.array(formula_names, dtype=str),
+            'solution_names': np.array(solution_names, dtype=str),
+            'a': np.ascontiguousarray(np.concatenate((a_formulas, a_solutions))),
+            'b': np.concatenate((b_formulas, b_solutions)),
+            'p': p}
+
+
+# Directory of the compiled catalogs of the databases (one for each pair of databases): meta.json describes the current one,
+# whose arrays are in subdirectory meta['arrays']
+def compiled_dir(formulas_path, solutions_path):
+    paths = f"{os.path.abspath(formulas_path)}\n{os.path.abspath(solutions_path)}"
+    return os.path.join(os.path.dirname(formulas_path), COMPILED_DIR, hashlib.sha256(paths.encode('utf-8')).hexdigest()[:16])
+
+
+# Compile the databases into binary arrays, return the catalog's description (meta)
+# Arrays are written in a temporary directory, renamed to the directory of these contents (kept if another process
+# compiled them first), then the description is switched to it and older compilations are removed when no longer open
+def compile_catalog(formulas_path, solutions_path):
+    paths = [formulas_path, solutions_path]
+    signature = sources_signature(paths)
+    meta = {'version': COMPILED_VERSION, 'schema': schema_hash(), 'sources': signature, 'hash': catalog_hash(paths)}
+    meta['arrays'] = hashlib.sha256(f"{COMPILED_VERSION}\n{meta['schema']}\n{meta['hash']}".encode('utf-8')).hexdigest()[:16]
+    arrays = read_databases(formulas_path, solutions_path)
+
+    directory = compiled_dir(formulas_path, solutions_path)
+    target = os.path.join(directory, meta['arrays'])
+    if not os.path.isdir(target):
+        temporary = f"{target}.{os.getpid()}.tmp"
+        os.makedirs(temporary, exist_ok=True)
+        for name in ARRAYS:
+            with open(os.path.join(temporary, name + '.npy'), 'wb') as f:
+                np.save(f, arrays[name])
+        try:
+            os.rename(temporary, target)
+        except OSError:
+            # compiled by another process in the meantime
+            shutil.rmtree(temporary, ignore_errors=True)
+    write_atomic(os.path.join(directory, 'meta.json'), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+    remove_old_compilations(directory, meta['arrays'])
+    return meta
+
+
+# Remove compilations other than current (not the temporary ones of running compilations), and arrays of older versions
+# Those still mapped by a process cannot be removed on Windows: they are removed by a later compilation
+def remove_old_compilations(directory, current):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name != current and not name.endswith('.tmp') and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith('.npy'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def write_atomic(path, write):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+# Description of the compiled catalog if it is up to date with the databases, None otherwise
+def current_meta(formulas_path, solutions_path):
+    directory = compiled_dir(formulas_path, solutions_path)
+    try:
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != COMPILED_VERSION or meta.get('schema') != schema_hash() or not os.path.isdir(os.path.join(directory, meta['arrays'])):
+        return None
+
+    paths = [formulas_path, solutions_path]
+    signature = sources_signature(paths)
+    if meta['sources'] == signature:
+        return meta
+
+    # databases touched (or moved): compare contents
+    if [source[0] for source in meta['sources']] != [source[0] for source in signature] or meta['hash'] != catalog_hash(paths):
+        return None
+    meta['sources'] = signature
+    try:
+        write_atomic(os.path.join(directory, 'meta.json'), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+    except OSError:
+        pass    # read-only directory: contents are compared again next time
+    return meta
+
+
+# Load the catalog of the databases, compiling it first if missing or out of date
+def load_catalog(formulas_path=None, solutions_path=None):
+    if formulas_path is None:
+        formulas_path = FORMULAS_DB
+    if solutions_path is None:
+        solutions_path = SOLUTIONS_DB
+
+    meta = current_meta(formulas_path, solutions_path)
+    if meta is None:
+        try:
+            meta = compile_catalog(formulas_path, solutions_path)
+        except OSError:
+            # databases in a read-only location (or missing, read_databases raises the error again)
+            return memory_catalog(formulas_path, solutions_path)
+
+    directory = os.path.join(compiled_dir(formulas_path, solutions_path), meta['arrays'])
+    try:
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+    except FileNotFoundError:
+        # removed by another process that has just compiled newer databases
+        meta = compile_catalog(formulas_path, solutions_path)
+        directory = os.path.join(compiled_dir(formulas_path, solutions_path), meta['arrays'])
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+    for array in arrays.values():
+        array.flags.writeable = False
+    return Catalog(arrays, meta)
+
+
+# Catalog read from the databases and kept in memory only, when it cannot be compiled next to them
+def memory_catalog(formulas_path, solutions_path):
+    paths = [formulas_path, solutions_path]
+    meta = {'sources': sources_signature(paths), 'hash': catalog_hash(paths)}
+    return Catalog(read_databases(formulas_path, solutions_path), meta)
+
+
+# Catalogs loaded by this process, by paths of their databases
+loaded_catalogs = {}
+
+
+# Catalog of the databases, loaded once by each process (and again only if the databases change)
+def get_catalog(formulas_path=None, solutions_path=None):
+    if formulas_path is None:
+        formulas_path = FORMULAS_DB
+    if solutions_path is None:
+        solutions_path = SOLUTIONS_DB
+
+    key = (os.path.abspath(formulas_path), os.path.abspath(solutions_path))
+    catalog = loaded_catalogs.get(key)
+    if catalog is None or catalog.sources != sources_signature(key):
+        catalog = load_catalog(*key)
+        loaded_catalogs[key] = catalog
+    return catalog
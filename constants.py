@@ -16,11 +16,22 @@
 # along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+
 # Constants
 # Define constants for model input
 DEFAULT_MMAX = 5
 DEFAULT_CMAX = 5
 DEFAULT_VMIN = 10        # mL
+DEFAULT_SMAX = DEFAULT_MMAX * 500 + 500     # mL, usually formula bottles are up to 500 mL each
+DEFAULT_DMAX = DEFAULT_MMAX * 500 + 500
+DEFAULT_MAX_SECONDS = 30   # s, time limit of the search for the optimal mix
+DEFAULT_MAX_GAP = 1e-4     # relative gap tolerated between the mix found and the optimal one
+RESULTS_CACHE_SIZE = 256   # results kept in memory by the results' cache
+RESULTS_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results_cache.sqlite")    # file of the results' cache used by the app (in the app's directory, not the current one)
+PARETO_STEPS = 5           # limits of waste and of priority penalty tried by the Pareto front (each from zero to the largest of the payoff table, see pareto.py)
+PARETO_EXTRA_DELTA = 0.01  # extra deviation (1%) tolerated when looking for mixes with less waste or penalty (and for the payoff table of the Pareto front)
+REGIMEN_MAX_SECONDS = 10   # s, time limit of the waste search of a multi-day regimen (a good plan is usually found in a few seconds, proving it optimal takes much longer)
 DEFAULT_WEIGHTS = ["1.0", "1.0", "1.0", "1.0", "0.1", "0.1", "0.1", "0.1", "0.1", "0.1"]
 
 # Define constants for model input's validation
@@ -36,6 +47,10 @@ AGE_MAX = 78            # years
 AGE_MAX_ACTUAL = 110    # years
 
 
+# Define constants for the graphical interface
+SOLVE_POLL_INTERVAL = 16    # ms between checks of a running calculation (about 60 frames per second)
+
+
 # User's settings
 LANG = "en"     # app's languange expressed in format ISO 639 set 1 (two letters) source: https://www.loc.gov/standards/iso639-2/php/English_list.php
 
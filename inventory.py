@@ -0,0 +1,114 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Stock of formulas and solutions (number of bottles of each product), shared by the app's processes
+# Kept in a sqlite file, so that it can be updated during a shift while calculators are running:
+# calculators read it before each solve (see MixCalculator.refresh_stock), ward plans take their bottles from it
+# Products are identified by kind ("formula" or "solution") and name; a name repeated in the same database
+# gets a suffix " [2]", " [3]", ... in order of appearance. Products not in the inventory have the default stock
+
+import sqlite3
+
+
+FORMULA = "formula"
+SOLUTION = "solution"
+
+# Seconds to wait for another process holding the inventory (e.g. while it takes bottles)
+TIMEOUT = 10
+
+UPSERT = "INSERT INTO stock VALUES (?, ?, ?) ON CONFLICT (kind, name) DO UPDATE SET bottles = excluded.bottles"
+
+
+# Keys (kind, name) of catalog products, formulas first
+def product_keys(formula_names, solution_names):
+    keys = []
+    for kind, names in ((FORMULA, formula_names), (SOLUTION, solution_names)):
+        seen = {}
+        for name in names:
+            seen[name] = seen.get(name, 0) + 1
+            keys.append((kind, name if seen[name] == 1 else f"{name} [{seen[name]}]"))
+    return keys
+
+
+class Inventory():
+    def __init__(self, path, timeout=TIMEOUT):
+        self.path = path
+        # transactions are explicit (see begin)
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS stock (kind TEXT, name TEXT, bottles INTEGER NOT NULL CHECK (bottles >= 0), PRIMARY KEY (kind, name))")
+        self.writes = 0
+
+
+    # Changes whenever the inventory changes, by this process or another one (no need to read it again otherwise)
+    def version(self):
+        return self.connection.execute("PRAGMA data_version").fetchone()[0], self.writes
+
+
+    # Number of bottles of products keys (default for products not in the inventory)
+    def get_stock(self, keys, default):
+        stock = {(kind, name): bottles for kind, name, bottles in self.connection.execute("SELECT kind, name, bottles FROM stock")}
+        return [stock.get(key, default) for key in keys]
+
+
+    # Set number of bottles of products, stock = {key: bottles}
+    def set_stock(self, stock):
+        for bottles in stock.values():
+            assert int(bottles) >= 0, "Number of bottles should be non-negative"
+        self.begin()
+        try:
+            self.connection.executemany(UPSERT, [(kind, name, int(bottles)) for (kind, name), bottles in stock.items()])
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.commit()
+
+
+    # Take bottles from the inventory, bottles = {key: number of bottles}, all of them or none
+    # Products not in the inventory have default stock. Returns False (nothing taken) if a product has not enough bottles,
+    # e.g. because another process took them after this one read the inventory
+    def take(self, bottles, default):
+        self.begin()
+        try:
+            for (kind, name), number in bottles.items():
+                row = self.connection.execute("SELECT bottles FROM stock WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+                stock = default if row is None else row[0]
+                if stock < number:
+                    self.connection.execute("ROLLBACK")
+                    return False
+                self.connection.execute(UPSERT, (kind, name, stock - int(number)))
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.commit()
+        return True
+
+
+    # Start a write transaction: other processes wait until it ends (BEGIN IMMEDIATE locks the file for writing)
+    def begin(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+
+    def commit(self):
+        self.connection.execute("COMMIT")
+        self.writes += 1
+
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
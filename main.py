@@ -15,10 +15,12 @@
 # You should have received a copy of the GNU General Public License
 # along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
 
+import threading
+import time
 import tkinter as tk
-from tkinter import font, ttk
+from tkinter import font, messagebox, ttk
 
-import constants, menu_bar, mix_calculator, results_manager,window_precompile
+import app_worker, constants, menu_bar, results_manager,window_precompile
 from constants import LABELS
 from nutrients_calculator import calculate_nutrients
 
@@ -32,6 +34,9 @@ class App(tk.Tk):
         self.config(padx=15, pady=5)
         self.minsize(1150, 650)
         self.geometry('+75+50')
+        # Debug panel with metrics of the last solve (shown from Preferences menu)
+        self.var_show_metrics = tk.BooleanVar(value=False)
+
         menubar = menu_bar.MenuBar(self)
         self.config(menu=menubar)
 
@@ -52,6 +57,33 @@ class App(tk.Tk):
 
         # Internal manager class
         self.results_manager = results_manager.ResultsManager(self)
+
+        # Solver process: runs the calculation outside Tk's main loop, keeping the same mix calculator for all solves
+        self.solver_pool = None
+        self.solver_pool_lock = threading.Lock()
+        self.solve_result = None
+
+        # Import the solver (pandas, mip) and start its process once the window is shown
+        self.after_idle(self.preload_solver)
+
+    # Start the solver in background, so that its modules are not loaded before the first frame
+    # (solve starts it anyway, waiting for the background start if still running)
+    def preload_solver(self):
+        threading.Thread(target=self.start_solver, daemon=True).start()
+
+    # Start the solver process, if not running
+    # The process builds the mix calculator (catalog and model) once, then reuses it
+    # It is built by a first task rather than by the pool's initializer, so that its errors (e.g. an invalid database)
+    # are shown by the next solve (which tries to build it again) instead of restarting the process forever
+    # The solver's modules are imported by that process only (see app_worker.py)
+    def start_solver(self):
+        import multiprocessing
+        with self.solver_pool_lock:
+            if self.solver_pool == None:
+                self.solver_pool = multiprocessing.get_context("spawn").Pool(processes=1, initializer=app_worker.init,
+                    initargs=(constants.DEFAULT_MAX_SECONDS, constants.DEFAULT_MAX_GAP, constants.RESULTS_CACHE_PATH))
+                self.solver_pool.apply_async(app_worker.prepare)
+            return self.solver_pool
     
     # Create all widgets for user input
     def create_input_widgets(self):
@@ -63,11 +95,11 @@ class App(tk.Tk):
         self.create_params_widgets()
         self.create_nutrients_widgets()
         self.create_precompile_widgets()
+        self.create_metrics_widgets()
 
-    # Solve problem and write results in main window
+    # Start solving problem in the solver process
+    # Results are written in main window by poll_solve when ready
     def solve(self, user_nutrients, user_weights):
-        print("Submitted: ", user_nutrients)
-
         if self.var_Mmax == "":
             self.var_Mmax = constants.DEFAULT_MMAX
         if self.var_Cmax == "":
@@ -79,10 +111,71 @@ class App(tk.Tk):
         if self.var_Dmax == "":
             self.var_Dmax = self.var_Mmax * 500 + 500 
         
-        objectives, m, c, formulas, solutions, nutrients, volume = mix_calculator.MixCalculator(int(self.var_Mmax.get()), int(self.var_Cmax.get()), float(self.var_Vmin.get()), float(self.var_Smax.get()), float(self.var_Dmax.get())).solve(user_nutrients, user_weights)
+        params = (int(self.var_Mmax.get()), int(self.var_Cmax.get()), float(self.var_Vmin.get()), float(self.var_Smax.get()), float(self.var_Dmax.get()))
+        self.solve_result = self.start_solver().apply_async(app_worker.solve_target_metrics, ((user_nutrients, user_weights, params),))
+        self.solve_start = time.perf_counter()
+        self.show_solving(True)
+        self.after(constants.SOLVE_POLL_INTERVAL, self.poll_solve)
+
+    # Check if the running calculation has finished
+    # Write results in main window if finished, else update elapsed time and check again later
+    def poll_solve(self):
+        if self.solve_result == None:     # cancelled
+            return
+
+        if not self.solve_result.ready():
+            self.label_solving['text'] = LABELS.string_solving.format(seconds=time.perf_counter() - self.solve_start)
+            self.after(constants.SOLVE_POLL_INTERVAL, self.poll_solve)
+            return
+
+        result = self.solve_result
+        self.solve_result = None
+        self.show_solving(False)
+
+        try:
+            (objectives, m, c, formulas, solutions, nutrients, volume, status, gap), metrics = result.get()
+        except Exception as e:
+            # the solver could not be built or failed: show the error, the next solve tries again
+            self.results_manager.clear()
+            messagebox.showerror('NutriOptiMix', LABELS.string_solve_error.format(error=e))
+            return
+        self.label_metrics['text'] = "\n".join(metrics.format_lines())
         # if self.results_manager == None:
         #     self.results_manager = results_manager.ResultsManager(self)
-        self.results_manager.write(objectives, m, c, formulas, solutions, nutrients, volume)
+        self.results_manager.write(objectives, m, c, formulas, solutions, nutrients, volume, status, gap)
+
+    # Stop the running calculation
+    # The solver process is terminated, a new one is started at next solve
+    def cancel_solve(self):
+        if self.solve_result == None:
+            return
+        self.solve_result = None
+        with self.solver_pool_lock:
+            self.solver_pool.terminate()
+            self.solver_pool = None
+        self.show_solving(False)
+        self.label_solving['text'] = LABELS.string_solve_cancelled
+        self.label_solving.pack(padx=3, side=tk.TOP)
+
+    # Show or hide widgets of a running calculation (elapsed time and cancel button)
+    def show_solving(self, solving):
+        if solving:
+            self.button_submit.state(['disabled'])
+            self.label_solving['text'] = LABELS.string_solving.format(seconds=0.0)
+            self.label_solving.pack(padx=3, side=tk.TOP)
+            self.button_cancel.pack(padx=3, ipadx=5, side=tk.TOP)
+        else:
+            self.button_submit.state(['!disabled'])
+            self.label_solving.pack_forget()
+            self.button_cancel.pack_forget()
+
+
+    # Show or hide the debug panel, as chosen in Preferences menu
+    def show_metrics_panel(self):
+        if self.var_show_metrics.get():
+            self.frame_metrics.pack(padx=15, pady=5, side=tk.BOTTOM, anchor='sw', fill='x')
+        else:
+            self.frame_metrics.pack_forget()
 
 
     ####################################################################
@@ -482,8 +575,12 @@ class App(tk.Tk):
         frame_submit = ttk.Frame(master=self.container_nutrients)
         frame_submit.pack(padx=5, pady=5, anchor='center')
 
-        button_submit = ttk.Button(master=frame_submit, text=LABELS.string_submit_button, command=handle_submit)
-        button_submit.pack(padx=3, ipadx=5, side=tk.TOP)
+        self.button_submit = ttk.Button(master=frame_submit, text=LABELS.string_submit_button, command=handle_submit)
+        self.button_submit.pack(padx=3, ipadx=5, side=tk.TOP)
+
+        # Create widgets shown while solving (elapsed time and cancel button)
+        self.label_solving = ttk.Label(master=frame_submit, anchor='center')
+        self.button_cancel = ttk.Button(master=frame_submit, text=LABELS.string_cancel_button, command=self.cancel_solve)
 
 
         # Create widgets for footnotes (instructions for user)
@@ -561,6 +658,17 @@ class App(tk.Tk):
         self.frame_patient = ttk.Frame(master=self.container_precompile)
 
 
+    ####################################################################
+    # Create debug panel with metrics of the last solve: time of each phase and solver's statistics (see solve_metrics.py)
+    # Hidden until chosen in Preferences menu
+    def create_metrics_widgets(self):
+        self.frame_metrics = ttk.LabelFrame(master=self.container_input, text=LABELS.string_metrics_title)
+
+        self.label_metrics = ttk.Label(master=self.frame_metrics, text=LABELS.string_metrics_none, justify='left',
+                                       font=(self.default_font.actual('family'), self.default_font.actual('size')-1, self.default_font.actual('weight')))
+        self.label_metrics.pack(padx=5, pady=3, anchor='w')
+
+
 ####################################################################
 # Start the application
 if __name__ == '__main__':
@@ -26,6 +26,7 @@ class MenuBar(tk.Menu):
         
         preferences = tk.Menu(self, tearoff=0)
         preferences.add_command(label="Change settings")
+        preferences.add_checkbutton(label="Show solver statistics", variable=window.var_show_metrics, command=window.show_metrics_panel)
         # TODO: create a popup window to change settings (font preferences, language, default values, protein per kg, harris-benedict version?)
         self.add_cascade(label="Preferences", menu=preferences)
 
@@ -16,22 +16,689 @@
 # along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import pandas as pd
+import importlib.util
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
 from mip import *
+from mip.cbc import cbclib, ffi, libfile
+from cffi import FFI
+
+import catalog
+import inventory
+import presolve
+from solve_metrics import MetricsLog, SolveMetrics
+
+# SciPy is optional: its MIP solver (HiGHS) is a backend only when it is installed
+# (imported only when HiGHS is used, importing it takes longer than the rest of the solver)
+HAS_SCIPY = importlib.util.find_spec("scipy") is not None
+
+# CBC functions not exposed by Python-MIP (statistics of the last search)
+cbcstats_ffi = FFI()
+cbcstats_ffi.cdef("int Cbc_getNodeCount(void *model); int Cbc_getIterationCount(void *model);")
+cbcstats = cbcstats_ffi.dlopen(libfile)
+
+# C library, to flush solvers' messages before standard output is restored (see MixCalculator.quiet)
+# Only on POSIX systems: on Windows the C runtime cannot be opened this way, and solvers' messages are not silenced
+libc_ffi = FFI()
+libc_ffi.cdef("int fflush(void *stream);")
+libc = libc_ffi.dlopen(None) if os.name == "posix" else None
+
+# Number of previous solutions kept to warm start the next solves
+WARM_START_SIZE = 32
+
+# Tolerance on the objectives fixed by the previous stages of a staged solve (relative, plus an absolute one for values near zero)
+STAGE_TOLERANCE = 1e-4
+STAGE_TOLERANCE_ABS = 1e-6
+
+# Priority levels forced for testing on the app's database (see create_data)
+TESTING_PRIORITIES = {"FRESUBIN INTESIVE": 0.8, "PEPTAMEN INTENSE": 0.5, "PEPTAMEN": 0.9}
 
+# Solver backends (see optimize_backend)
+BACKEND_AUTO = "auto"
+BACKEND_CBC = "cbc"
+BACKEND_HIGHS = "highs"
+BACKEND_LP_ROUND = "lp_round"
+BACKENDS = (BACKEND_AUTO, BACKEND_CBC, BACKEND_HIGHS, BACKEND_LP_ROUND)
+
+# With backend auto, models with at least this number of columns are solved by HiGHS instead of CBC (when SciPy is installed)
+HIGHS_MIN_COLUMNS = 10000
+
+# Volume of the LP relaxation above which a product is used in the rounded mix [mL]
+LP_ROUND_TOLERANCE = 1e-6
+
+
+# Reusable engine: catalog data and model are built once, then the same model is solved many times.
+# Change parameters with set_params() and targets with solve(), without building a new MixCalculator
+# With warm_start, each solve starts from the solution of the nearest previous target (fewer nodes to explore),
+# but CBC may then stop at a mix slightly worse than the one found from scratch
 class MixCalculator():
-    def __init__(self, Mmax=5, Cmax=5, Vmin=1, Smax=3000, Dmax=3000):
+    # formulas_db, solutions_db : paths of the databases (None for the app's databases, see catalog.py)
+    # presolve : leave out of the model products that cannot improve the mix (see presolve.py)
+    # tight : tighter formulation, with bounds of variables derived from the catalog and valid inequalities (see create_model)
+    # staged : lexicographic solve, least waste s among the mixes with the best delta, then least penalty d (see solve_stages)
+    # inventory_db : path of the inventory giving the number of bottles available (see inventory.py), None for the default stock
+    # backend : solver of the model, one of BACKENDS (see optimize_backend)
+    # candidates : solve first with only the best candidates formulas and solutions (this number of each) for the target,
+    #   None to always solve with all products (see optimize_candidates)
+    # metrics_log : path of a file where the metrics of each solve are appended as JSON lines (see solve_metrics.py), None for no log
+    def __init__(self, Mmax=5, Cmax=5, Vmin=1, Smax=3000, Dmax=3000, max_seconds=INF, max_gap=1e-4, warm_start=False, formulas_db=None, solutions_db=None,
+                 presolve=True, tight=False, staged=False, inventory_db=None, backend=BACKEND_AUTO, candidates=None, metrics_log=None):
+        assert backend in BACKENDS, "Unknown backend: " + str(backend)
+        assert backend != BACKEND_HIGHS or HAS_SCIPY, "Backend highs needs SciPy"
+        assert candidates is None or candidates > 0, "Number of candidates should be positive"
+        self.backend = backend
+        self.candidates = candidates
+        self.restricted = None
+        self.backend_used = None
+        self.values = None
+        self.search_counts = (0, 0)
+        self.formulas_db = formulas_db
+        self.solutions_db = solutions_db
+        self.inventory_db = inventory_db
+        self.presolve = presolve
+        self.tight = tight
+        self.staged = staged
+        self.stage_seconds = []
+        self.stage_counts = []
+        self.extraction_seconds = 0.0
+        self.metrics = None
+        self.metrics_log = MetricsLog(metrics_log) if metrics_log is not None else None
+        start = time.perf_counter()
         self.create_data(Mmax, Cmax, Vmin, Smax, Dmax)
+        self.catalog_seconds = time.perf_counter() - start
+        start = time.perf_counter()
         self.create_model()
+        self.build_seconds = time.perf_counter() - start
+        self.set_limits(max_seconds, max_gap)
+        self.warm_start = warm_start
+        self.past_solutions = deque(maxlen=WARM_START_SIZE)
     
 
     # Set target and solve
+    # The previous target (if any) is replaced, so the same instance can be solved for many targets
+    # status is the solver's OptimizationStatus: OPTIMAL, FEASIBLE (a limit was reached, best mix found so far)
+    # or, when there is no mix, INFEASIBLE, NO_SOLUTION_FOUND, ...
+    # gap is the relative gap between the mix found and the best possible one (None if there is no mix)
+    # stage_seconds has the time of each stage of the last solve (only one without staged), metrics the record of its phases (see record_metrics)
     def solve(self, user_nutrients, user_weights):
+        self.refresh_catalog()
+        start = time.perf_counter()
+        self.refresh_stock()
         self.set_target(user_nutrients, user_weights)
-        self.model.optimize()
-        self.get_results()
+        set_target_seconds = time.perf_counter() - start
+        self.set_start()
+        self.optimize()
+        self.save_start()
+        self.record_metrics(set_target_seconds, time.perf_counter() - start)
         
-        return self.objectives, self.M_used, self.C_used, self.formulas, self.solutions, self.nutrients, self.total_volume
+        return self.objectives, self.M_used, self.C_used, self.formulas, self.solutions, self.nutrients, self.total_volume, self.status, self.gap
+
+
+    # Solve and take the bottles of the mix from the inventory (a plan for a patient of the ward)
+    # If other processes took some of the bottles first, solve again with the stock left
+    def solve_and_take(self, user_nutrients, user_weights):
+        assert self.inventory is not None, "Taking bottles needs an inventory"
+        while True:
+            result = self.solve(user_nutrients, user_weights)
+            if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                return result
+            bottles = {self.product_keys[k]: number for k, number in self.bottles_used}
+            if self.inventory.take(bottles, self.fmax_default):
+                return result
+
+
+    # Set target and find its k best mixes with distinct combinations of products, best first (fewer if there are no more mixes)
+    # After each mix, a no-good cut excludes its combination of products (y) and the same model is solved again,
+    # so each mix leaves out at least one product of each previous mix;
+    # cuts are removed at the end, so the model is unchanged for the next solves
+    # Each result is the same tuple returned by solve
+    def solve_alternatives(self, user_nutrients, user_weights, k):
+        assert k > 0, "Number of alternative mixes should be positive"
+        results = [self.solve(user_nutrients, user_weights)]
+        cuts = []
+        try:
+            while len(results) < k and self.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                cuts.append(self.add_no_good_cut())
+                self.clear_start()
+                self.optimize()
+                if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                    break
+                results.append((self.objectives, self.M_used, self.C_used, self.formulas, self.solutions, self.nutrients, self.total_volume, self.status, self.gap))
+        finally:
+            if len(cuts) > 0:
+                self.model.remove(cuts)
+        # CBC may stop at a slightly worse mix than a later one: best first
+        return sorted(results, key=lambda result: (result[0][0] is None, result[0][0]))
+
+
+    # Set target and find the mix with the least waste (objective s) or the least penalty (objective d) among the mixes
+    # with deviation at most delta_max (a point of the payoff table of the Pareto front, see pareto.py)
+    # The model is restored at the end for the next solves. Returns the same tuple returned by solve
+    def solve_least(self, user_nutrients, user_weights, objective, delta_max):
+        assert objective in ("s", "d"), "Objective should be 's' or 'd'"
+        self.refresh_catalog()
+        self.refresh_stock()
+        self.set_target(user_nutrients, user_weights)
+        self.clear_start()
+        try:
+            self.delta.ub = delta_max
+            self.model.objective = minimize(self.s if objective == "s" else self.d)
+            self.optimize_cbc()
+            if self.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                self.get_results()
+        finally:
+            self.delta.ub = INF
+            self.model.objective = minimize(self.delta)
+        return self.objectives, self.M_used, self.C_used, self.formulas, self.solutions, self.nutrients, self.total_volume, self.status, self.gap
+
+
+    # Cut excluding the combination of products (values of y) of the last solution: at least one product used must be left out
+    # (combinations with the same products plus other ones are excluded too, they would not replace a product that is missing)
+    def add_no_good_cut(self):
+        used = np.flatnonzero(self.solution_values()[[var.idx for var in self.y]] > 0.5).tolist()
+        return self.model.add_constr(xsum(self.y[i] for i in used) <= len(used) - 1)
+
+
+    # Solve the model for the current target and starting solution, then extract results (all stages if staged)
+    def optimize(self):
+        start = time.perf_counter()
+        if self.candidates is not None:
+            self.optimize_candidates()
+        else:
+            self.optimize_backend(self.backend)
+        self.stage_seconds = [time.perf_counter() - start]
+        self.stage_counts = [self.search_counts]
+        start = time.perf_counter()
+        self.get_results()
+        self.extraction_seconds = time.perf_counter() - start
+        if self.staged:
+            self.solve_stages()
+
+
+    # Record the metrics of the last solve (see solve_metrics.py) in self.metrics, and append them to the metrics log if any
+    # Solver's time, nodes and iterations are summed over the stages
+    def record_metrics(self, set_target_seconds, total_seconds):
+        self.log_metrics(SolveMetrics(catalog_seconds=self.catalog_seconds, build_seconds=self.build_seconds, set_target_seconds=set_target_seconds,
+                                      optimize_seconds=sum(self.stage_seconds), stage_seconds=list(self.stage_seconds), extraction_seconds=self.extraction_seconds, total_seconds=total_seconds,
+                                      nodes=int(sum(counts[0] for counts in self.stage_counts)), iterations=int(sum(counts[1] for counts in self.stage_counts)),
+                                      gap=self.gap, status=self.status.name, backend=self.backend_used, restricted=self.restricted))
+
+
+    # Record the metrics of a result taken from a cache instead of solving (see ResultsCache.solve)
+    def record_cached(self, result, total_seconds):
+        self.log_metrics(SolveMetrics(catalog_seconds=self.catalog_seconds, build_seconds=self.build_seconds, total_seconds=total_seconds,
+                                      gap=result[-1], status=result[-2].name, cached=True))
+
+
+    def log_metrics(self, metrics):
+        self.metrics = metrics
+        if self.metrics_log is not None:
+            self.metrics_log.write(metrics)
+
+
+    # Set limits of the search: max time in seconds and max relative gap between the mix found and the best possible one
+    # When a limit is reached, solve returns the best mix found so far
+    def set_limits(self, max_seconds=INF, max_gap=1e-4):
+        assert max_seconds > 0, "Time limit should be positive"
+        assert max_gap >= 0, "Gap limit should be non-negative"
+        self.max_seconds = max_seconds
+        self.max_gap = max_gap
+        self.model.max_seconds = min(max_seconds, sys.float_info.max)     # CBC does not accept INF
+        self.model.max_mip_gap = max_gap
+
+
+    # CBC keeps the last solution found and uses it as starting solution of the next optimize()
+    # With a starting solution CBC can stop at a suboptimal mix, so it is discarded before each solve
+    def clear_start(self):
+        cbclib.Cbc_setMIPStart(self.model.solver._model, 0, ffi.NULL, ffi.NULL)
+
+
+    # Values of all columns of the model in the last solution, read from CBC in one call, or those of the last backend that is not CBC
+    # (index with the column arrays x_cols, f_cols, ... built by create_model)
+    def solution_values(self):
+        if self.values is not None:
+            return self.values.copy()
+        return self.cbc_values()
+
+
+    # (sizes from NumPy: ffi.sizeof parses the type holding cffi's lock, and a Model freed meanwhile by the garbage collector
+    # would wait for the same lock)
+    def cbc_values(self):
+        values = cbclib.Cbc_getColSolution(self.model.solver._model)
+        return np.frombuffer(ffi.buffer(values, self.model.num_cols * np.dtype(np.float64).itemsize), dtype=np.float64).copy()
+
+
+    # Number of branch and bound nodes and of simplex iterations of the last solve
+    # (nodes of HiGHS and no iterations with backend highs, LP iterations and no nodes with lp_round)
+    def search_stats(self):
+        return self.search_counts
+
+
+    # Solve the model with backend, one of BACKENDS:
+    # - cbc: branch and bound of CBC
+    # - highs: HiGHS, the MIP solver of SciPy (scipy.optimize.milp), on the arrays of the same model; starting solutions are not used
+    # - lp_round: LP relaxation, then products (y) and bottles (f) rounded from its volumes and fixed, and the LP solved again.
+    #   The relaxation is a lower bound of delta, so the mix is OPTIMAL if within the gap limit (FEASIBLE otherwise);
+    #   there is no mix (NO_SOLUTION_FOUND) if rounding breaks a constraint, usually Mmax or Cmax when they are active
+    # - auto: lp_round, and if it does not give an OPTIMAL mix, highs for models of at least HIGHS_MIN_COLUMNS columns
+    #   (when SciPy is installed) or cbc
+    # Sets status, values (None when the solution is CBC's one), objective_value, objective_bound, search_counts and backend_used
+    # Later stages of a staged solve always use CBC, starting from the mix found
+    def optimize_backend(self, backend):
+        if backend == BACKEND_AUTO:
+            self.optimize_lp_round()
+            if self.status == OptimizationStatus.OPTIMAL:
+                return
+            backend = BACKEND_HIGHS if HAS_SCIPY and self.model.num_cols >= HIGHS_MIN_COLUMNS else BACKEND_CBC
+
+        if backend == BACKEND_CBC:
+            self.optimize_cbc()
+        elif backend == BACKEND_HIGHS:
+            self.optimize_highs()
+        else:
+            self.optimize_lp_round()
+
+
+    def optimize_cbc(self):
+        self.status = self.model.optimize()
+        self.values = None
+        self.backend_used = BACKEND_CBC
+        self.search_counts = (cbcstats.Cbc_getNodeCount(self.model.solver._model), cbcstats.Cbc_getIterationCount(self.model.solver._model))
+        if self.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            self.objective_value = self.model.objective_value
+            self.objective_bound = self.model.objective_bound
+
+
+    def optimize_highs(self):
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        lower, upper, objective, integrality, matrix, row_lower, row_upper = self.model_arrays()
+        options = {"mip_rel_gap": self.max_gap, "disp": self.model.verbose > 0}
+        if self.max_seconds < INF:
+            options["time_limit"] = self.max_seconds
+        result = self.quiet(lambda: milp(objective, integrality=integrality, bounds=Bounds(lower, upper),
+                                         constraints=LinearConstraint(matrix, row_lower, row_upper), options=options))
+
+        self.backend_used = BACKEND_HIGHS
+        self.search_counts = (getattr(result, "mip_node_count", 0), 0)
+        self.values = None
+        if result.x is not None:
+            self.status = OptimizationStatus.OPTIMAL if result.status == 0 else OptimizationStatus.FEASIBLE
+            self.values = np.asarray(result.x, dtype=np.float64)
+            self.objective_value = float(result.fun)
+            self.objective_bound = float(getattr(result, "mip_dual_bound", result.fun))
+        elif result.status == 2:
+            self.status = OptimizationStatus.INFEASIBLE
+        elif result.status == 3:
+            self.status = OptimizationStatus.UNBOUNDED
+        elif result.status == 1:
+            self.status = OptimizationStatus.NO_SOLUTION_FOUND
+        else:
+            self.status = OptimizationStatus.ERROR
+
+
+    def optimize_lp_round(self):
+        self.backend_used = BACKEND_LP_ROUND
+        self.values = None
+        self.status = self.solve_lp()
+        iterations = cbcstats.Cbc_getIterationCount(self.model.solver._model)
+        self.search_counts = (0, iterations)
+        # no LP solution: no mix either
+        if self.status != OptimizationStatus.OPTIMAL:
+            return
+        bound = self.model.objective_value
+        quantities = self.cbc_values()[self.x_cols]
+        used = quantities > LP_ROUND_TOLERANCE
+        bottles = np.where(used, np.ceil(quantities / self.b - 1e-9), 0.0)
+        # products used in each chain of identical products are moved to its first products (as many bottles or more)
+        for chain in self.symmetry_chains:
+            order = [i for i in chain if used[i]] + [i for i in chain if not used[i]]
+            used[chain] = used[order]
+            bottles[chain] = bottles[order]
+
+        # fix products and bottles, solve the LP again, then restore bounds for the next solves
+        saved = [(var, var.lb, var.ub) for var in self.y + self.f]
+        try:
+            for var, value in zip(self.y + self.f, used.tolist() + bottles.tolist()):
+                var.lb = var.ub = float(value)
+            status = self.solve_lp()
+            self.search_counts = (0, iterations + cbcstats.Cbc_getIterationCount(self.model.solver._model))
+            if status == OptimizationStatus.OPTIMAL:
+                self.values = self.cbc_values()
+                self.objective_value = self.model.objective_value
+        finally:
+            for var, lb, ub in saved:
+                var.lb = lb
+                var.ub = ub
+
+        if self.values is None:
+            self.status = OptimizationStatus.NO_SOLUTION_FOUND
+            return
+        self.objective_bound = bound
+        if self.objective_value - bound > self.max_gap * abs(self.objective_value) and self.objective_value > 1e-10:
+            self.status = OptimizationStatus.FEASIBLE
+
+
+    # Solve with only candidate products for the current target, or with all products if candidates have no mix
+    # Candidates are the products of the LP relaxation's solution and, for formulas and for solutions separately,
+    # those whose use at minimum volume raises the LP's delta least (reduced costs), up to self.candidates of each.
+    # Other products are left out by fixing their y to 0, like products out of stock.
+    # The LP relaxation with all products is a lower bound of delta: the mix of candidates is OPTIMAL if within the gap limit of it,
+    # otherwise (usually when Mmax or Cmax are active) it is FEASIBLE, with its gap from that bound.
+    # restricted is True if the mix is the one of candidates, False if the model with all products was solved
+    def optimize_candidates(self):
+        self.restricted = False
+        if self.solve_lp() != OptimizationStatus.OPTIMAL:
+            self.optimize_backend(self.backend)
+            return
+        bound = self.model.objective_value
+        values = self.cbc_values()
+        costs = np.frombuffer(ffi.buffer(cbclib.Cbc_getReducedCost(self.model.solver._model), self.model.num_cols * np.dtype(np.float64).itemsize),
+                              dtype=np.float64)
+        others = np.flatnonzero(~self.select_candidates(values[self.x_cols], costs[self.x_cols] * self.Vmin_list + costs[self.y_cols])).tolist()
+        if len(others) == 0:
+            self.optimize_backend(self.backend)
+            return
+
+        for i in others:
+            self.y[i].ub = 0.0
+        try:
+            self.optimize_backend(self.backend)
+        finally:
+            self.fix_out_of_stock(others)
+
+        if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            self.optimize_backend(self.backend)
+            return
+        self.restricted = True
+        self.objective_bound = bound
+        if self.objective_value - bound > self.max_gap * abs(self.objective_value) and self.objective_value > 1e-10:
+            self.status = OptimizationStatus.FEASIBLE
+
+
+    # Candidate products (boolean array) from the volumes of the LP relaxation and the LP's cost of using each product
+    def select_candidates(self, quantities, costs):
+        selected = quantities > LP_ROUND_TOLERANCE
+        for products in (range(self.nFormulas), range(self.nFormulas, self.nFormulas + self.nSolutions)):
+            products = np.array(products, dtype=np.int64)
+            available = products[(self.fmax[products] > 0) & ~selected[products]]
+            missing = self.candidates - int(selected[products].sum())
+            if missing > 0:
+                selected[available[np.argsort(costs[available], kind="stable")[:missing]]] = True
+        # products before a candidate in its chain of identical products are candidates too
+        for chain in self.symmetry_chains:
+            last = max([k for k, i in enumerate(chain) if selected[i]], default=-1)
+            selected[chain[:last + 1]] = True
+        return selected
+
+
+    # LP relaxation of the model, solved from scratch: after the target rows are replaced,
+    # CBC's resolve from the last basis can stop at a worse LP solution
+    def solve_lp(self):
+        cbclib.Cbc_reset(self.model.solver._model)
+        return self.quiet(lambda: self.model.optimize(relax=True))
+
+
+    # Call function with standard output silenced unless verbose:
+    # CBC's LP solver and HiGHS write some messages on it whatever the log level
+    # (only where the C library's buffers can be flushed, see libc)
+    def quiet(self, function):
+        if self.model.verbose > 0 or libc is None:
+            return function()
+
+        sys.stdout.flush()
+        stdout_fd = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.close(devnull)
+        try:
+            return function()
+        finally:
+            libc.fflush(libc_ffi.NULL)
+            os.dup2(stdout_fd, 1)
+            os.close(stdout_fd)
+
+
+    # Arrays of the model as stored in CBC, for other solvers: bounds, objective and integrality of columns,
+    # matrix of rows (sparse) and bounds of rows
+    def model_arrays(self):
+        from scipy.sparse import csr_array
+        cbc = self.model.solver._model
+        n = self.model.num_cols
+        size = n * np.dtype(np.float64).itemsize
+        lower = np.frombuffer(ffi.buffer(cbclib.Cbc_getColLower(cbc), size), dtype=np.float64).copy()
+        upper = np.frombuffer(ffi.buffer(cbclib.Cbc_getColUpper(cbc), size), dtype=np.float64).copy()
+        objective = np.frombuffer(ffi.buffer(cbclib.Cbc_getObjCoefficients(cbc), size), dtype=np.float64).copy()
+        integrality = np.array([cbclib.Cbc_isInteger(cbc, j) for j in range(n)], dtype=np.uint8)
+
+        starts = [0]
+        indices = []
+        coefficients = []
+        row_lower = np.full(self.model.num_rows, -np.inf)
+        row_upper = np.full(self.model.num_rows, np.inf)
+        for r in range(self.model.num_rows):
+            nz = cbclib.Cbc_getRowNz(cbc, r)
+            indices.append(np.frombuffer(ffi.buffer(cbclib.Cbc_getRowIndices(cbc, r), nz * np.dtype(np.intc).itemsize), dtype=np.intc))
+            coefficients.append(np.frombuffer(ffi.buffer(cbclib.Cbc_getRowCoeffs(cbc, r), nz * np.dtype(np.float64).itemsize), dtype=np.float64))
+            starts.append(starts[-1] + nz)
+            rhs = cbclib.Cbc_getRowRHS(cbc, r)
+            sense = cbclib.Cbc_getRowSense(cbc, r)
+            if sense in (b"L", b"E"):
+                row_upper[r] = rhs
+            if sense in (b"G", b"E"):
+                row_lower[r] = rhs
+        matrix = csr_array((np.concatenate(coefficients), np.concatenate(indices), np.array(starts)), shape=(self.model.num_rows, n))
+
+        # CBC stores infinite bounds as the largest double
+        lower[lower <= -1e30] = -np.inf
+        upper[upper >= 1e30] = np.inf
+        return lower, upper, objective, integrality, matrix, row_lower, row_upper
+
+
+    # Starting solution of the next optimize(): solution of the nearest previous target with the same parameters
+    # (any parameters if there is none), or no starting solution if warm start is disabled
+    def set_start(self):
+        self.clear_start()
+        if not self.warm_start:
+            return
+
+        params = (self.Mmax, self.Cmax, self.Vmin, self.Smax, self.Dmax)
+        candidates = [past for past in self.past_solutions if past[2] == params]
+        if len(candidates) == 0:
+            candidates = self.past_solutions
+        if len(candidates) == 0:
+            return
+
+        # the most recent one among equally near solutions
+        nearest = min(reversed(candidates), key=lambda past: self.target_distance(past[0], past[1]))
+        self.model.start = nearest[3]
+
+
+    # Values of variables x, y, f in the last solution, as a starting solution (model.start)
+    def incumbent(self):
+        variables = self.x + self.y + self.f
+        return list(zip(variables, self.solution_values()[[var.idx for var in variables]].tolist()))
+
+
+    # Save the solution found for the current target, to warm start the next solves
+    def save_start(self):
+        if not self.warm_start or self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            return
+        params = (self.Mmax, self.Cmax, self.Vmin, self.Smax, self.Dmax)
+        self.past_solutions.append((self.o, self.w, params, self.incumbent()))
+
+
+    # Stages after the first one of a staged solve: minimize waste s with delta fixed (within STAGE_TOLERANCE),
+    # then penalty d with delta and s fixed. Each stage changes objective and bounds of the same model
+    # and starts from the mix of the previous stage, then the model is restored for the next solve
+    # status and gap remain those of delta; status is FEASIBLE if a later stage did not reach its optimum
+    def solve_stages(self):
+        if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            return
+        status = self.status
+        gap = self.gap
+        try:
+            for fixed, objective in ((self.delta, self.s), (self.s, self.d)):
+                fixed.ub = self.solution_values()[fixed.idx] * (1 + STAGE_TOLERANCE) + STAGE_TOLERANCE_ABS
+                self.model.objective = minimize(objective)
+                self.model.start = self.incumbent()
+                start = time.perf_counter()
+                self.optimize_cbc()
+                self.stage_seconds.append(time.perf_counter() - start)
+                self.stage_counts.append(self.search_counts)
+                if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                    # no mix (limit reached before accepting the starting one): keep results of the previous stage
+                    status = OptimizationStatus.FEASIBLE
+                    break
+                start = time.perf_counter()
+                self.get_results()
+                self.extraction_seconds += time.perf_counter() - start
+                if self.status != OptimizationStatus.OPTIMAL:
+                    status = OptimizationStatus.FEASIBLE
+        finally:
+            self.delta.ub = INF
+            self.s.ub = INF
+            self.model.objective = minimize(self.delta)
+            self.status = status
+            self.gap = gap
+
+
+    # Distance between the current target and a previous one (relative differences of nutrients, plus differences of weights)
+    def target_distance(self, o, w):
+        distance = 0.0
+        for j in self.N:
+            if max(o[j], self.o[j]) > 0:
+                distance += abs(o[j] - self.o[j]) / max(o[j], self.o[j])
+            distance += abs(w[j] - self.w[j])
+        return distance
+
+
+    # Change model parameters of an already built model
+    # Only the right-hand sides of the existing constraints are updated, the model is not rebuilt
+    def set_params(self, Mmax, Cmax, Vmin, Smax, Dmax):
+        self.Mmax = Mmax
+        self.Cmax = Cmax
+        self.Vmin = Vmin
+        self.Smax = Smax
+        self.Dmax = Dmax
+        self.check_params()
+        self.create_Vmin_list()
+
+        self.constr_Mmax.rhs = self.Mmax
+        self.constr_Cmax.rhs = self.Cmax
+        for i in self.M.union(self.C):
+            self.constrs_Vmin[i].rhs = self.Vmin_list[i] - self.b[i]
+        self.constr_Smax.rhs = self.Smax
+        self.constr_Dmax.rhs = self.Dmax
+        if self.tight:
+            self.replace_Vmin_y_constrs()
+
+
+    # Replace rows x >= Vmin * y of the tighter formulation (Vmin is a coefficient, solver's rows cannot change it)
+    def replace_Vmin_y_constrs(self):
+        if len(self.constrs_Vmin_y) > 0:
+            self.model.remove(self.constrs_Vmin_y)
+        self.constrs_Vmin_y = [self.model.add_constr(self.x[i] - self.Vmin_list[i] * self.y[i] >= 0) for i in self.M.union(self.C)]
+
+
+    # Bounds of variables derived from the catalog (tighter formulation): no more bottles than available,
+    # nutrient values and mix volume at most those of all the bottles available
+    def set_bounds(self):
+        for i in self.M.union(self.C):
+            self.f[i].ub = float(self.fmax[i])
+            self.x[i].ub = float(self.b[i] * self.fmax[i])
+        stock = self.b * self.fmax
+        for j in self.N:
+            self.n[j].ub = float(0.01 * np.dot(self.a[:, j], stock))
+        self.V.ub = float(stock.sum())
+
+
+    # Read the inventory again if it changed since last time, and update the model's stock (see set_stock)
+    def refresh_stock(self):
+        if self.inventory is None:
+            return
+        version = self.inventory.version()
+        if version == self.inventory_version:
+            return
+        self.inventory_version = version
+        self.set_stock(self.inventory.get_stock(self.product_keys, int(self.fmax_default)))
+
+
+    # Build data and model again if the databases changed since they were built (so a calculator kept for a whole session,
+    # as the app's one, uses the databases edited meanwhile); parameters, limits and log level are kept
+    # Checked with the databases' modification time and size (see catalog.get_catalog)
+    def refresh_catalog(self):
+        if catalog.get_catalog(self.formulas_db, self.solutions_db).hash == self.catalog_hash:
+            return
+        verbose = self.model.verbose
+        start = time.perf_counter()
+        self.create_data(self.Mmax, self.Cmax, self.Vmin, self.Smax, self.Dmax)
+        self.catalog_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        self.create_model()
+        self.build_seconds = time.perf_counter() - start
+        self.set_limits(self.max_seconds, self.max_gap)
+        self.model.verbose = verbose
+        self.past_solutions.clear()
+
+
+    # Change stock (number of bottles of each catalog product, in catalog order) of an already built model
+    # Only products whose stock changed are updated: their rows f <= fmax * y are replaced (fmax is a coefficient,
+    # solver's rows cannot change it), products out of stock are fixed to zero by the bounds of y
+    def set_stock(self, product_fmax):
+        product_fmax = np.array(product_fmax, dtype=np.int64)
+        assert product_fmax.shape == self.product_fmax.shape, "Stock should have one value for each product of the catalog"
+        assert (product_fmax >= 0).all(), "Number of bottles should be non-negative"
+        self.product_fmax = product_fmax
+        fmax = product_fmax[self.products]
+        changed = np.flatnonzero(fmax != self.fmax).tolist()
+        self.fmax = fmax
+        if len(changed) == 0:
+            return
+        self.replace_symmetry_constrs()
+
+        self.model.remove([self.constrs_fmax[i] for i in changed])
+        for i in changed:
+            self.constrs_fmax[i] = self.model.add_constr(self.f[i] <= self.y[i] * self.fmax[i])
+        if self.tight:
+            self.model.remove([self.constrs_stock[i] for i in changed])
+            for i in changed:
+                self.constrs_stock[i] = self.model.add_constr(self.x[i] <= self.b[i] * self.fmax[i] * self.y[i])
+            self.set_bounds()
+        self.fix_out_of_stock(changed)
+
+
+    # Fix to zero products (indexes of the model) without bottles available, free the others
+    def fix_out_of_stock(self, indexes):
+        for i in indexes:
+            self.y[i].ub = 0.0 if self.fmax[i] == 0 else 1.0
+
+
+    # Rows y[next] <= y[previous] along each chain of identical products (see presolve.symmetry_chains),
+    # replaced only if the order of the chains changed: their number of rows does not depend on stock
+    def replace_symmetry_constrs(self):
+        chains = presolve.symmetry_chains(self.a, self.b, self.p, self.fmax, self.nFormulas) if self.presolve else []
+        if chains == self.symmetry_chains:
+            return
+        self.model.remove(self.constrs_symmetry)
+        self.symmetry_chains = chains
+        self.constrs_symmetry = [self.model.add_constr(self.y[chain[k+1]] <= self.y[chain[k]])
+                                 for chain in chains for k in range(len(chain) - 1)]
+
+
+    # Check model parameters
+    def check_params(self):
+        assert self.Mmax >= 0, "Mmax should be non-negative"
+        assert self.Cmax >= 0, "Cmax should be non-negative"
+        assert self.Vmin >= 0, "Vmin should be non-negative"
+
+
+    # Vmin values for each formula/solution (the lowest between parameter Vmin and bottle's volume)
+    def create_Vmin_list(self):
+        self.Vmin_list = np.minimum(float(self.Vmin), self.b)
 
 
     # Declare data that will be used by the model
@@ -45,164 +712,78 @@ class MixCalculator():
         self.Smax = Smax                # Max total waste tolerated
         self.Dmax = Dmax                # Max penalty for use of lower priority formulas
         self.b_default = 500         # Default bottle volume [ml]
-        self.fmax_default = 10       # Default number of available bottles
+        self.fmax_default = 10       # Default number of available bottles (products not in the inventory, see inventory.py)
         self.p_default = 1           # Default priority level for formulas
         # self.okLactose = True        # True if there are no concerns about lactose in mix
 
-        # TODO: insert f_max values in db instead of using arbitrary constant
-
         # Checks
-        assert self.Mmax >= 0, "Mmax should be non-negative"
-        assert self.Cmax >= 0, "Cmax should be non-negative"
-        assert self.Vmin >= 0, "Vmin should be non-negative"
+        self.check_params()
         assert self.b_default > 0, "Bottle volume default value should be positive"
         assert self.fmax_default >= 0, "Default number of available bottles should be non-negative"
         assert self.p_default > 0, "Default formula priority level should be positive"
 
 
-        ## Formulas
-
-        # import formulas data from csv (nutrient values per 100ml)
-        df = pd.read_csv('Database/prodotti_new_pesati.csv',
-                        encoding='utf-8',
-                        usecols=['Nome Prodotto',
-        #                          'Note',
-        #                          'Prezzo',
-                                'Volume',
-                                'Peso',
-                                'Kcal',
-        #                          'mOsm/L',
-        #                          'Acqua (ml)',
-        #                          'P/L/C (%)',
-                                'Prot. gr.',
-                                'Lipidi gr.',
-        #                          'MCT',
-        #                          'LCT',
-                                'Carbo gr. ',
-        #                          'EPA DHA (g)',
-        #                          'Latt.',
-        #                          'Fibra PHGG',
-                                'Na (mg)',
-                                'K (mg)',
-                                'Ca (mg)',
-                                'Mg (mg)',
-                                'P (mg)',
-                                'Fe (mg)'
-                                ]
-                        )
-
-        # column names cleaning
-        df.columns = [c.lower().split(' ', 1)[0] for c in df.columns]
-        df.rename(columns={'latt.': 'lactose'}, inplace=True)
-
-        # manage lactose
-        # if not okLactose:
-        #     if 'lactose' in df.columns:
-        #         df.lactose = df.lactose.str.lower()
-        #         df.lactose = df.lactose.fillna(True)  # with no data, assume formula may contain lactose
-        #         df.loc[df['lactose'] == 'no', 'lactose'] = False
-        #         df.loc[df['lactose'] == 'sì', 'lactose'] = True
-        #         df.loc[(df['lactose'] != False) & (df['lactose'] != True), 'lactose'] = True
-        #         df = df[(df.lactose == False)]        # keep lactose-free formulas only
-        #     else:
-        #         print("Warning: Missing data about lactose in formulas. Continued solving with all formulas\n")
-
-
-        # save formula names and number of formulas
-        self.formula_names = [str(n) for n in df.nome]
-        self.nFormulas = len(self.formula_names)
-
-        # filter data and manage na
-        df = df.select_dtypes(include='number')
-        df.volume = df.volume.fillna(self.b_default)
-        df.peso = df.peso.fillna(self.p_default)
-        df = df.fillna(0)
-
-        # extract bottle volumes into parameter b (only formulas' for now)
-        self.b = [float(v) for v in df.volume]
-        df.drop('volume', axis=1, inplace=True)
+        ## Catalog
 
-        # extract formula priority levels into parameter p
-        self.p = [float(r) for r in df.peso]
-        df.drop('peso', axis=1, inplace=True)
+        # load formulas and solutions (validated and compiled from the databases once, shared by all calculators of the process)
+        data = catalog.get_catalog(self.formulas_db, self.solutions_db)
 
-        ########## TO FORCE A PRIORITIZATION FOR TESTING: #################
-        self.p[13] = 0.5
-        self.p[9] = 0.8
-        self.p[15] = 0.9
-        ###################################################################
+        # identify the catalog (used by results' cache)
+        self.catalog_hash = data.hash
 
-        # put max number of bottles available in parameter fmax (only formulas' for now)
-        self.fmax = [int(self.fmax_default) for i in range(self.nFormulas)]
-
-        # save nutrient values per 100ml (df data) in parameter a (only formulas' for now)
-        self.a = []
-        for i in range(self.nFormulas):   
-            row = df.iloc[[i]].values[0][0:]                                # row = list of values in row i (pandas type)
-            row_string = str(row)[1:-1]                                     # row_string = str row without external []
-            row_string = row_string.replace("\n", "")                       # cleaning row_string
-            nutrient_values_strings = row_string.strip().split()             
-            nutrient_values = [float(x) for x in nutrient_values_strings]
-            self.a.append(nutrient_values)
-
-        # save the number of nutrients found in db
-        self.nNutrients = len(df.columns)
-
-
-        ## Solutions
-
-        # import solutions data from csv (nutrient values per 100ml)
-        # IMPORTANT: COLUMNS USED FOR PARAMETER A AND THE ORDER IN WHICH THEY ARE IMPORTED MUST BE THE SAME AS FORMULAS'
-        df_s = pd.read_csv('Database/miscele_povere.csv',
-                        encoding='utf-8',
-                        usecols=['Nome',
-                                'Volume flacone',
-                                'Kcal',
-        #                          'mOsm/L',
-        #                          'Acqua (ml)',
-                                'Prot. gr.',
-                                'Lipidi gr.',
-                                'Carbo gr. ',
-                                'Na (mg)',
-                                'K (mg)',
-                                'Ca (mg)',
-                                'Mg (mg)',
-                                'P (mg)',
-                                'Fe (mg)'
-                                ]
-                        )
-        # column names cleaning
-        df_s.columns = [c.lower().split(' ', 1)[0] for c in df_s.columns]
-
-        # save solutions names and number of solutions
-        self.solution_names = [str(n) for n in df_s.nome]
+        # save formula and solution names and their number
+        self.formula_names = data.formula_names
+        self.nFormulas = len(self.formula_names)
+        self.solution_names = data.solution_names
         self.nSolutions = len(self.solution_names)
 
-        # filter data and manage na
-        df_s = df_s.select_dtypes(include='number')
-        df_s.volume = df_s.volume.fillna(self.b_default)
-        df_s = df_s.fillna(0)
-
-        # extract bottle volumes column and append to parameter b
-        for v in df_s.volume:
-            self.b.append(float(v))
-        df_s.drop('volume', axis=1, inplace=True)
+        # bottle volumes into parameter b (default volume if missing)
+        self.b = np.where(np.isnan(data.b), float(self.b_default), data.b)
 
-        # append solutions' max number of bottles available to parameter fmax
-        for i in range(self.nSolutions):
-            self.fmax.append(int(self.fmax_default))
+        # formula priority levels into parameter p (default priority if missing)
+        self.p = np.where(np.isnan(data.p), float(self.p_default), data.p)
 
-        # check that the number of nutrients in df_s is the same as in df
-        assert len(df_s.columns) == self.nNutrients, "Number of nutrients in formulas' db must be the same as in solutions' db"
+        ########## TO FORCE A PRIORITIZATION FOR TESTING: #################
+        # only for the app's own database (other databases give their own priority levels), by formula name
+        if os.path.abspath(self.formulas_db or catalog.FORMULAS_DB) == os.path.abspath(catalog.SHIPPED_FORMULAS_DB):
+            self.p = self.p.copy()
+            for k, name in enumerate(self.formula_names):
+                if name in TESTING_PRIORITIES:
+                    self.p[k] = TESTING_PRIORITIES[name]
+        ###################################################################
 
-        # append solutions' nutrient values per 100ml to parameter a
-        for i in range(self.nSolutions):   
-            row = df_s.iloc[[i]].values[0][0:]                              # row = list of values in row i (pandas type)
-            row_string = str(row)[1:-1]                                     # row_string = str row without external []
-            row_string = row_string.replace("\n", "")                       # cleaning row_string
-            nutrient_values_strings = row_string.strip().split()             
-            nutrient_values = [float(x) for x in nutrient_values_strings]
-            self.a.append(nutrient_values)
+        # nutrient values per 100ml in parameter a and the number of nutrients found in db
+        self.a = data.a
+        self.nNutrients = self.a.shape[1]
+
+        # put max number of bottles available in parameter fmax (from the inventory, if any)
+        self.product_keys = inventory.product_keys(self.formula_names, self.solution_names)
+        self.inventory = None
+        self.inventory_version = None
+        if self.inventory_db is not None:
+            self.inventory = inventory.Inventory(self.inventory_db)
+            self.inventory_version = self.inventory.version()
+            self.fmax = np.array(self.inventory.get_stock(self.product_keys, int(self.fmax_default)), dtype=np.int64)
+        else:
+            self.fmax = np.full(self.nFormulas + self.nSolutions, int(self.fmax_default), dtype=np.int64)
+
+        # presolve: products of the model are the catalog products that can improve the mix (catalog index of each in
+        # products). Keep catalog products' names and stock to report results
+        self.product_names = list(self.formula_names) + list(self.solution_names)
+        self.product_fmax = self.fmax
+        if self.presolve:
+            self.products = presolve.reduce_catalog(self.a)
+        else:
+            self.products = list(range(self.nFormulas + self.nSolutions))
+        formulas = [i for i in self.products if i < self.nFormulas]
+        self.formula_names = [self.product_names[i] for i in formulas]
+        self.solution_names = [self.product_names[i] for i in self.products[len(formulas):]]
+        self.nFormulas = len(self.formula_names)
+        self.nSolutions = len(self.solution_names)
+        self.a = self.a[self.products]
+        self.b = self.b[self.products]
+        self.p = self.p[formulas]
+        self.fmax = self.product_fmax[self.products]
 
         ## Sets
         self.M = set(range(self.nFormulas))
@@ -210,12 +791,7 @@ class MixCalculator():
         self.N = set(range(self.nNutrients))
 
         # Vmin values for each formula/solution (the lowest between parameter Vmin and bottle's volume)
-        self.Vmin_list = []
-        for i in self.M.union(self.C):
-            if Vmin < self.b[i]:
-                self.Vmin_list.append(Vmin)
-            else:
-                self.Vmin_list.append(self.b[i])
+        self.create_Vmin_list()
 
         ## Prints to check data
         # print("DATA checks")
@@ -272,6 +848,23 @@ class MixCalculator():
         # var V = total mix volume [ml]
         V = self.model.add_var(name="V", lb=0.0)
 
+        # keep variables, to set targets and bounds and to read results without looking them up by name
+        self.x = x
+        self.y = y
+        self.f = f
+        self.delta = delta
+        self.s = s
+        self.d = d
+        self.n = n
+        self.V = V
+
+        # column indexes of variables, to read the solution in bulk (see solution_values)
+        self.x_cols = np.array([var.idx for var in x], dtype=np.int64)
+        self.y_cols = np.array([var.idx for var in y], dtype=np.int64)
+        self.f_cols = np.array([var.idx for var in f], dtype=np.int64)
+        self.n_cols = np.array([var.idx for var in n], dtype=np.int64)
+        self.objective_cols = np.array([delta.idx, s.idx, d.idx], dtype=np.int64)
+
 
         ##### OBJECTIVE #####
 
@@ -282,9 +875,11 @@ class MixCalculator():
         ##### CONSTRAINTS #####
 
         # For each formula or solution, the number of bottles opened must be between one and the maximum number of bottles available if the formula or solution is used in the mix, zero otherwise.
+        # (rows with fmax are replaced when stock changes, see set_stock)
+        self.constrs_fmax = []
         for i in self.M.union(self.C):
             self.model += f[i] >= y[i]
-            self.model += f[i] <= y[i] * self.fmax[i]
+            self.constrs_fmax.append(self.model.add_constr(f[i] <= y[i] * self.fmax[i]))
 
         # For each formula or solution, the number of bottles opened for the mix must be the minimum necessary to provide the requested quantity
         for i in self.M.union(self.C):
@@ -292,14 +887,15 @@ class MixCalculator():
             # self.model += x[i] >= self.b[i] * (f[i]-1)    # redundant because of Vmin constraint
 
         # The maximum number of formulas to use in the mix is limited by the given constant Mmax
-        self.model += xsum(y[t] for t in self.M) <= self.Mmax
+        self.constr_Mmax = self.model.add_constr(xsum(y[t] for t in self.M) <= self.Mmax)
 
         # The maximum number of solutions to use in the mix is limited by the given constant Cmax
-        self.model += xsum(y[c] for c in self.C) <= self.Cmax
+        self.constr_Cmax = self.model.add_constr(xsum(y[c] for c in self.C) <= self.Cmax)
 
         # To avoid costly waste, a bottle of formula or solution is used only if the requested quantity is greater or equal than the given minimum volume Vmin
+        self.constrs_Vmin = []
         for i in self.M.union(self.C):
-            self.model += x[i] >= self.Vmin_list[i] + (f[i]-1) * self.b[i]
+            self.constrs_Vmin.append(self.model.add_constr(x[i] >= self.Vmin_list[i] + (f[i]-1) * self.b[i]))
 
         # The nutrient values of the mix are calculated and stored in variables n_j
         for j in self.N:
@@ -319,11 +915,40 @@ class MixCalculator():
         
         # Secondary objective: minimize formula waste
         # Limit total waste of formula by parameter Smax (set by the user)
-        self.model += s <= self.Smax
+        self.constr_Smax = self.model.add_constr(s <= self.Smax)
 
         # Secondary objective: follow formula priorirty (minimize formula priority penalty)
         # Limit penalty by parameter Dmax (set by the user)
-        self.model += d <= self.Dmax
+        self.constr_Dmax = self.model.add_constr(d <= self.Dmax)
+
+        # Identical products (presolve) are used in order of stock: the same mixes, without their copies
+        # (rows replaced when stock changes, see set_stock)
+        self.symmetry_chains = []
+        self.constrs_symmetry = []
+        self.replace_symmetry_constrs()
+
+        # Tighter formulation (optional): the same mixes, with a smaller linear relaxation
+        if self.tight:
+            self.set_bounds()
+
+            # A formula or solution that is not used has no volume, and at most its whole stock otherwise
+            # (implied by the constraints on f, but explicit for CBC's preprocessing)
+            self.constrs_stock = []
+            for i in self.M.union(self.C):
+                self.constrs_stock.append(self.model.add_constr(x[i] <= self.b[i] * self.fmax[i] * y[i]))
+
+            # A formula or solution that is used has at least volume Vmin (rows replaced by set_params)
+            self.constrs_Vmin_y = []
+            self.replace_Vmin_y_constrs()
+
+        # Products out of stock are not used
+        self.fix_out_of_stock(self.M.union(self.C))
+
+        # Constraints defining delta for the current target: two named rows for each nutrient,
+        # replaced by set_target so that the model keeps the same size whatever the target
+        # Rows of nutrients that are not a target are placeholders (delta >= 0)
+        self.target_constrs = {}
+        self.replace_target_constrs([0.0 for j in self.N], [0.0 for j in self.N])
 
 
     # Set model's target nutrients values and weights
@@ -366,11 +991,37 @@ class MixCalculator():
         
         # add target indexes set to model 
         self.O = set(target_indexes)
+        self.o = o
+        self.w = w
+
+        self.replace_target_constrs(o, w)
+
 
-        # Define delta as the maximum percentage deviation between each nutrient’s target and obtained value, weighted by that nutrient’s nutritional importance
-        for k in self.O:
-            self.model += self.model.var_by_name("delta") >= w[k] * (self.model.var_by_name("n({})".format(k))/o[k] - 1)
-            self.model += self.model.var_by_name("delta") >= w[k] * (- self.model.var_by_name("n({})".format(k))/o[k] + 1)
+    # Remove current target from model (delta rows become placeholders)
+    def clear_target(self):
+        self.O = set()
+        self.replace_target_constrs([0.0 for j in self.N], [0.0 for j in self.N])
+
+
+    # Replace the rows defining delta with the ones for target o and weights w
+    # (o[k] <= 0 means nutrient k is not a target)
+    def replace_target_constrs(self, o, w):
+        # remove rows of the previous target
+        old_constrs = [constr for pair in self.target_constrs.values() for constr in pair]
+        if old_constrs:
+            self.model.remove(old_constrs)
+
+        delta = self.delta
+        for k in self.N:
+            # Define delta as the maximum percentage deviation between each nutrient’s target and obtained value, weighted by that nutrient’s nutritional importance
+            if o[k] > 0.0:
+                n_k = self.n[k]
+                constr_over = self.model.add_constr(delta >= w[k] * (n_k/o[k] - 1), name="target_over({})".format(k))
+                constr_under = self.model.add_constr(delta >= w[k] * (- n_k/o[k] + 1), name="target_under({})".format(k))
+            else:
+                constr_over = self.model.add_constr(delta >= 0, name="target_over({})".format(k))
+                constr_under = self.model.add_constr(delta >= 0, name="target_under({})".format(k))
+            self.target_constrs[k] = (constr_over, constr_under)
 
 
     # Print results on stdout
@@ -378,9 +1029,10 @@ class MixCalculator():
         if(self.M_used == None):
             self.get_results()
         # print(f"Valore obiettivo = {self.model.objective_value:.{6}}")
-        print(f"delta = {self.model.var_by_name('delta').x:.6f}")
-        print(f"s = {round(self.model.var_by_name('s').x)} mL")
-        print(f"d = {round(self.model.var_by_name('d').x)}")
+        print(f"delta = {self.objectives[0]:.6f}")
+        print(f"s = {round(self.objectives[1])} mL")
+        print(f"d = {round(self.objectives[2])}")
+        print("Solve time: " + ", ".join(f"{seconds:.3f} s" for seconds in self.stage_seconds))
 
         print("Formulas used: ", self.M_used)
         print("Solutions used: ", self.C_used)
@@ -398,28 +1050,47 @@ class MixCalculator():
 
     # Extract results from after-solve model's variables
     def get_results(self):
-        self.objectives = [self.model.var_by_name('delta').x, self.model.var_by_name('s').x, self.model.var_by_name('d').x]
-        
+        # no mix found (infeasible, or limit reached before finding one)
+        if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            self.objectives = [None, None, None]
+            self.M_used = 0
+            self.C_used = 0
+            self.formulas = []
+            self.solutions = []
+            self.nutrients = [None for j in self.N]
+            self.total_volume = None
+            self.gap = None
+            return
+
+        # gap between mix found and best possible mix
+        if self.status == OptimizationStatus.OPTIMAL or self.objective_value <= 1e-10:
+            self.gap = 0.0
+        else:
+            self.gap = abs(self.objective_value - self.objective_bound) / abs(self.objective_value)
+
+        # all values of the solution in one call, then products used selected in bulk
+        values = self.solution_values()
+        self.objectives = values[self.objective_cols].tolist()
+        quantities = values[self.x_cols]
+        numbers = values[self.f_cols]
+
         self.M_used = 0
         self.C_used = 0
         self.formulas = []
         self.solutions = []
-        for i in range(self.nFormulas + self.nSolutions):
-            quantity = self.model.var_by_name("x({})".format(i)).x
-            name = ""
-            number = self.model.var_by_name("f({})".format(i)).x
-            # print(i, f[i].x, y[i].x, x[i].x)
-            if quantity > 0:
-                if i < self.nFormulas:
-                    name = self.formula_names[i]
-                    self.M_used += 1
-                    component = (quantity, name, number, self.b[i])
-                    self.formulas.append(component)
-                else:
-                    name = self.solution_names[i-self.nFormulas]
-                    self.C_used += 1
-                    component = (quantity, name, number, self.b[i])
-                    self.solutions.append(component) 
+        self.bottles_used = []
+        for i in np.flatnonzero(quantities > 0).tolist():
+            quantity = float(quantities[i])
+            number = float(numbers[i])
+            k = self.products[i]
+            component = (quantity, self.product_names[k], number, self.b[i])
+            self.bottles_used.append((k, round(number)))
+            if i < self.nFormulas:
+                self.M_used += 1
+                self.formulas.append(component)
+            else:
+                self.C_used += 1
+                self.solutions.append(component)
         
-        self.nutrients = [self.model.var_by_name('n({})'.format(i)).x for i in self.N]
-        self.total_volume = self.model.var_by_name('V').x
\ No newline at end of file
+        self.nutrients = values[self.n_cols].tolist()
+        self.total_volume = float(values[self.V.idx])
\ No newline at end of file
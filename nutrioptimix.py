@@ -0,0 +1,289 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+# Command line interface: calculate the optimal mix without the graphical interface
+# Does not import tkinter, so it runs on servers without display
+#
+# Examples (from the app's directory):
+#   python -m nutrioptimix --patient 70 175 60 M
+#   python -m nutrioptimix --nutrients 0 90 60 250 2000 3500 800 375 800 14 --Mmax 3
+#   python -m nutrioptimix --json targets.json
+#   python -m nutrioptimix --csv targets.csv --workers 4
+#   python -m nutrioptimix --patient 70 175 60 M --pareto 5
+#   python -m nutrioptimix --patient 70 175 60 M --alternatives 3
+#   python -m nutrioptimix --csv ward.csv --ward max
+#   python -m nutrioptimix --csv days.csv --regimen 48
+#
+# JSON input is an object or a list of objects with keys:
+#   "nutrients" (list of 10 values) or "patient" ([weight, height, age, gender]),
+#   optional "weights" (list of 10 values) and "params" (object with keys Mmax, Cmax, Vmin, Smax, Dmax)
+# CSV input has one target per row, with columns:
+#   energy, protein, fat, carbs, na, k, ca, mg, p, fe (nutrients) or weight, height, age, gender (patient),
+#   optional w_energy, w_protein, ... (weights) and Mmax, Cmax, Vmin, Smax, Dmax (parameters)
+#
+# With --pareto, each target gives the list of its non-dominated mixes (delta vs waste vs penalty, see pareto.py)
+# With --alternatives, each target gives the list of its best mixes with distinct products (see MixCalculator.solve_alternatives)
+# With --ward, all targets are the patients of a ward sharing bottles and stock (see ward_calculator.py): the output is an object
+# with the mix of each patient ("patients"), the bottles opened ("bottles") and the formula waste of the ward ("waste");
+# with --inventory, the ward's bottles are taken from it
+# With --regimen, targets are the consecutive days of one patient, sharing bottles within their hang time (see regimen_planner.py):
+# the output is an object with the mix of each day ("days"), the bottles opened each day ("bottles") and the total formula waste ("waste");
+# with --inventory, stock is read from it but the plan's bottles are not taken (they are taken day by day)
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import constants
+from nutrients_calculator import calculate_nutrients
+
+
+# Nutrients in the order used by the model
+NUTRIENT_KEYS = ["energy", "protein", "fat", "carbs", "na", "k", "ca", "mg", "p", "fe"]
+PARAM_KEYS = ["Mmax", "Cmax", "Vmin", "Smax", "Dmax"]
+PATIENT_KEYS = ["weight", "height", "age", "gender"]
+
+
+# Convert the tuple returned by MixCalculator.solve into a dictionary
+# status is the solver's status (OPTIMAL, FEASIBLE if a limit was reached, INFEASIBLE, NO_SOLUTION_FOUND, ...)
+# values are None if no mix was found (and numbers of bottles in ward mode, where bottles are shared)
+def result_to_dict(result):
+    objectives, M_used, C_used, formulas, solutions, nutrients, volume, status, gap = result
+    return {
+        "status": status.name,
+        "gap": gap,
+        "delta": objectives[0],
+        "s": objectives[1],
+        "d": objectives[2],
+        "formulas": [{"name": name, "quantity": quantity, "bottles": None if number is None else round(number), "bottle_volume": bottle} for quantity, name, number, bottle in formulas],
+        "solutions": [{"name": name, "quantity": quantity, "bottles": None if number is None else round(number), "bottle_volume": bottle} for quantity, name, number, bottle in solutions],
+        "nutrients": dict(zip(NUTRIENT_KEYS, nutrients)),
+        "volume": volume,
+    }
+
+
+# Build a target (nutrients, weights, params) from a dictionary read from JSON
+def target_from_json(item, default_weights, default_params):
+    if "nutrients" in item:
+        nutrients = [float(n) for n in item["nutrients"]]
+    elif "patient" in item:
+        nutrients = calculate_nutrients(*item["patient"])
+    else:
+        raise ValueError("Each target needs 'nutrients' or 'patient'")
+
+    weights = [float(w) for w in item.get("weights", default_weights)]
+
+    params = list(default_params)
+    for i, key in enumerate(PARAM_KEYS):
+        if key in item.get("params", {}):
+            params[i] = item["params"][key]
+    return nutrients, weights, tuple(params)
+
+
+# Build a target (nutrients, weights, params) from a CSV row
+def target_from_csv(row, default_weights, default_params):
+    if all(row.get(key, "") != "" for key in PATIENT_KEYS):
+        nutrients = calculate_nutrients(*[row[key] for key in PATIENT_KEYS])
+    else:
+        nutrients = [float(row.get(key, "") or 0) for key in NUTRIENT_KEYS]
+
+    weights = list(default_weights)
+    for i, key in enumerate(NUTRIENT_KEYS):
+        if row.get("w_" + key, "") != "":
+            weights[i] = float(row["w_" + key])
+
+    params = list(default_params)
+    for i, key in enumerate(PARAM_KEYS):
+        if row.get(key, "") != "":
+            params[i] = float(row[key])
+    return nutrients, weights, tuple(params)
+
+
+# Open a file given on the command line ('-' is standard input)
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, encoding='utf-8', newline='')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nutrioptimix", description="Calculate the optimal mix of enteral nutrition formulas and solutions.")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--nutrients", nargs=len(NUTRIENT_KEYS), type=float, metavar="N", help="target values: " + ", ".join(NUTRIENT_KEYS) + " (values <= 0 are not a target)")
+    source.add_argument("--patient", nargs=len(PATIENT_KEYS), metavar=("WEIGHT", "HEIGHT", "AGE", "GENDER"), help="calculate target values from patient's data (kg, cm, years, M/F)")
+    source.add_argument("--json", metavar="FILE", help="read targets from a JSON file ('-' for standard input)")
+    source.add_argument("--csv", metavar="FILE", help="read targets from a CSV file ('-' for standard input)")
+
+    parser.add_argument("--weights", nargs=len(NUTRIENT_KEYS), type=float, metavar="W", default=[float(w) for w in constants.DEFAULT_WEIGHTS], help="nutrients' weights, between 0 and 1")
+    parser.add_argument("--Mmax", type=int, default=constants.DEFAULT_MMAX, help="max number of formulas")
+    parser.add_argument("--Cmax", type=int, default=constants.DEFAULT_CMAX, help="max number of solutions")
+    parser.add_argument("--Vmin", type=float, default=constants.DEFAULT_VMIN, help="min volume of each formula/solution [mL]")
+    parser.add_argument("--Smax", type=float, default=constants.DEFAULT_SMAX, help="max total formula waste tolerated [mL]")
+    parser.add_argument("--Dmax", type=float, default=constants.DEFAULT_DMAX, help="max penalty for use of lower priority formulas")
+
+    parser.add_argument("--max-seconds", type=float, default=constants.DEFAULT_MAX_SECONDS, help="time limit for each target [s]: when reached, the best mix found so far is returned")
+    parser.add_argument("--max-gap", type=float, default=constants.DEFAULT_MAX_GAP, help="relative gap tolerated between the mix found and the optimal one")
+    parser.add_argument("--formulas", default=None, metavar="FILE", help="database of formulas (csv), instead of the app's one")
+    parser.add_argument("--solutions", default=None, metavar="FILE", help="database of solutions (csv), instead of the app's one")
+    parser.add_argument("--inventory", default=None, metavar="FILE", help="take the number of bottles available from this inventory (sqlite), and take the bottles of each mix (or of the ward) from it; --regimen only reads the stock")
+    parser.add_argument("--cache", default=None, metavar="FILE", help="save results in this file and reuse them for repeated targets")
+    parser.add_argument("--workers", type=int, default=0, help="solve targets in parallel with this number of processes")
+    parser.add_argument("--backend", choices=["auto", "cbc", "highs", "lp_round"], default="auto", help="solver: CBC, HiGHS (needs SciPy), LP relaxation and rounding, or automatic choice (default)")
+    parser.add_argument("--candidates", type=int, default=None, metavar="K", help="solve each target with only its K best candidate formulas and solutions (for large catalogs): a mix not proven optimal among all products is FEASIBLE, with its gap")
+    parser.add_argument("--metrics-log", default=None, metavar="FILE", help="append time of each phase and solver's statistics of each solve to this file (JSON lines)")
+    parser.add_argument("--staged", action="store_true", help="among the mixes with the best deviation, choose the one with least waste, then least penalty")
+    parser.add_argument("--alternatives", type=int, default=None, metavar="K", help="return the K best mixes, each one leaving out at least one product of the previous ones")
+    parser.add_argument("--ward", choices=["max", "sum"], default=None, help="solve all targets together as a ward sharing bottles: minimize the worst deviation (max) or the sum of deviations (sum), then the ward's waste")
+    parser.add_argument("--regimen", type=float, default=None, metavar="HOURS", help="solve targets as the consecutive days of one patient, using opened bottles for up to HOURS (on a later day only if they may hang until its end, e.g. 48 for the next day), then minimize the regimen's waste")
+    parser.add_argument("--pareto", type=int, default=None, metavar="STEPS", help="return the Pareto front of deviation, waste and penalty, trying STEPS x STEPS limits of waste and penalty (in parallel with --workers processes)")
+    parser.add_argument("--indent", type=int, default=None, help="indentation of JSON output")
+    parser.add_argument("--verbose", action="store_true", help="show solver's log (on standard error)")
+    return parser, parser.parse_args(argv)
+
+
+# Read all targets requested on the command line
+def read_targets(args):
+    default_params = (args.Mmax, args.Cmax, args.Vmin, args.Smax, args.Dmax)
+
+    if args.nutrients is not None:
+        return [(args.nutrients, args.weights, default_params)]
+    if args.patient is not None:
+        return [(calculate_nutrients(*args.patient), args.weights, default_params)]
+    if args.json is not None:
+        with open_input(args.json) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [data]
+        return [target_from_json(item, args.weights, default_params) for item in data]
+
+    with open_input(args.csv) as f:
+        return [target_from_csv(row, args.weights, default_params) for row in csv.DictReader(f)]
+
+
+# Solve targets one after the other with the same MixCalculator (repeated targets are solved once)
+# With alternatives (number of mixes), each result is the list of the best mixes of the target (not cached)
+# With an inventory, each mix takes its bottles from it (not cached)
+# With metrics_log, the metrics of each solve are appended to this file (see solve_metrics.py)
+# Returns the results and the metrics of each target (SolveMetrics of its last solve)
+def solve_targets(targets, max_seconds, max_gap, verbose, cache_path=None, formulas_db=None, solutions_db=None, staged=False, alternatives=None,
+                  inventory_db=None, backend="auto", candidates=None, metrics_log=None):
+    # solver's log is written on standard output (also by the solver's C library): keep it away from results
+    sys.stdout.flush()
+    stdout_fd = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        from mix_calculator import MixCalculator
+        from results_cache import ResultsCache
+
+        cache = ResultsCache(constants.RESULTS_CACHE_SIZE, cache_path)
+        calculator = None
+        results = []
+        metrics = []
+        for nutrients, weights, params in targets:
+            if calculator is None:
+                calculator = MixCalculator(*params, max_seconds=max_seconds, max_gap=max_gap, formulas_db=formulas_db, solutions_db=solutions_db,
+                                           staged=staged, inventory_db=inventory_db, backend=backend,
+                                           candidates=candidates, metrics_log=metrics_log)
+                calculator.model.verbose = int(verbose)
+            else:
+                calculator.set_params(*params)
+            if alternatives is not None:
+                results.append(calculator.solve_alternatives(nutrients, weights, alternatives))
+            elif inventory_db is not None:
+                results.append(calculator.solve_and_take(nutrients, weights))
+            else:
+                results.append(cache.solve(calculator, nutrients, weights))
+            metrics.append(calculator.metrics)
+        cache.close()
+        return results, metrics
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+
+
+def main(argv=None):
+    parser, args = parse_args(argv)
+
+    try:
+        targets = read_targets(args)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        parser.error(str(e))
+    if (args.ward is not None or args.regimen is not None) and len(targets) == 0:
+        parser.error("--ward and --regimen need at least one target")
+
+    try:
+        if args.ward is not None:
+            from ward_calculator import WardCalculator
+            ward = WardCalculator(*targets[0][2], objective=args.ward, max_seconds=args.max_seconds, max_gap=args.max_gap, formulas_db=args.formulas,
+                                  solutions_db=args.solutions, inventory_db=args.inventory)
+            ward_targets = [(nutrients, weights) for nutrients, weights, params in targets]
+            results = ward.solve_and_take(ward_targets) if args.inventory is not None else ward.solve(ward_targets)
+        elif args.regimen is not None:
+            from regimen_planner import RegimenPlanner
+            regimen = RegimenPlanner(*targets[0][2], hang_hours=args.regimen, max_seconds=args.max_seconds, max_gap=args.max_gap, formulas_db=args.formulas,
+                                     solutions_db=args.solutions, inventory_db=args.inventory)
+            results = regimen.plan([(nutrients, weights) for nutrients, weights, params in targets])
+        elif args.pareto is not None:
+            from pareto import pareto_front
+            workers = args.workers if args.workers > 0 else None
+            fronts = [pareto_front(nutrients, weights, params, args.pareto, workers, args.max_seconds, args.max_gap, formulas_db=args.formulas, solutions_db=args.solutions)
+                      for nutrients, weights, params in targets]
+        elif args.workers > 0 and args.alternatives is None:
+            from batch_solver import solve_batch
+            solved = solve_batch(targets, workers=args.workers, max_seconds=args.max_seconds, max_gap=args.max_gap, cache_path=args.cache,
+                                 formulas_db=args.formulas, solutions_db=args.solutions, staged=args.staged,
+                                 inventory_db=args.inventory, backend=args.backend, candidates=args.candidates, metrics_log=args.metrics_log,
+                                 metrics=True)
+            results = [result for result, m in solved]
+            metrics = [m for result, m in solved]
+        else:
+            results, metrics = solve_targets(targets, args.max_seconds, args.max_gap, args.verbose, args.cache, args.formulas, args.solutions, args.staged, args.alternatives,
+                                    args.inventory, args.backend, args.candidates, args.metrics_log)
+    except (AssertionError, OSError) as e:
+        parser.error(str(e))
+
+    if args.ward is not None:
+        output = {"patients": [result_to_dict(r) for r in results],
+                  "bottles": [{"name": name, "bottles": number, "bottle_volume": bottle} for name, number, bottle in ward.bottles],
+                  "waste": ward.waste, "separate_waste": ward.separate_waste, "status": ward.status.name, "stage_seconds": ward.stage_seconds}
+    elif args.regimen is not None:
+        output = {"days": [result_to_dict(r) for r in results],
+                  "bottles": [[{"name": name, "bottles": number, "bottle_volume": bottle} for name, number, bottle in day] for day in regimen.bottles],
+                  "waste": regimen.waste, "separate_waste": regimen.separate_waste, "status": regimen.status.name, "stage_seconds": regimen.stage_seconds}
+    elif args.pareto is not None:
+        output = [[result_to_dict(r) for r in front] for front in fronts]
+    elif args.alternatives is not None:
+        output = [[result_to_dict(r) for r in mixes] for mixes in results]
+    else:
+        output = [result_to_dict(r) for r in results]
+        # solver's time of each stage (empty for results taken from the cache)
+        if args.staged:
+            for item, m in zip(output, metrics):
+                item["stage_seconds"] = m.stage_seconds
+    # one target: its result, not a list (ward and regimen give one plan anyway)
+    if (args.nutrients is not None or args.patient is not None) and args.ward is None and args.regimen is None:
+        output = output[0]
+    json.dump(output, sys.stdout, indent=args.indent)
+    sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Pareto front of the mixes for one target: deviation delta vs formula waste s vs priority penalty d
+# Epsilon-constraint method: delta is minimized with waste and penalty limited by Smax and Dmax, for a grid of limits
+# between zero and the largest waste and penalty of the payoff table: the best mix with the user's parameters, the mix
+# with least waste and the one with least penalty among those with at most extra_delta more deviation than the best one
+# (the mix with least penalty may have much more waste than the best one, and the other way round)
+# Each row of the grid (one penalty limit) is solved by a process holding its own MixCalculator, rows run in parallel;
+# within a row waste limits increase, so each mix is a valid starting solution of the next solve (warm start)
+#
+# Example: mixes with at most 1% more deviation than the best one, least waste first
+#   front = pareto_front(nutrients, weights)
+#   mixes = within_deviation(front)
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from mip import OptimizationStatus
+
+import constants
+from batch_solver import DEFAULT_PARAMS
+from mix_calculator import MixCalculator
+
+
+# Tolerance of comparisons between objectives (relative, solver's values are not exact)
+TOLERANCE = 1e-6
+
+# MixCalculator of the current worker process
+calculator = None
+
+
+# Build the MixCalculator of a worker process (catalog and model)
+# max_seconds, max_gap : limits of the search for each point (see MixCalculator.set_limits)
+# warm_start : start each solve of a row from the previous mix (see MixCalculator)
+# formulas_db, solutions_db : paths of the databases (None for the app's databases)
+def init_worker(max_seconds=constants.DEFAULT_MAX_SECONDS, max_gap=constants.DEFAULT_MAX_GAP, warm_start=True, formulas_db=None, solutions_db=None):
+    global calculator
+    calculator = MixCalculator(*DEFAULT_PARAMS, max_seconds=max_seconds, max_gap=max_gap, warm_start=warm_start, formulas_db=formulas_db, solutions_db=solutions_db)
+    calculator.model.verbose = 0
+
+
+# Solve one row of the grid in a worker process
+# row = (nutrients, weights, params, list of waste limits (increasing), penalty limit)
+def solve_row(row):
+    nutrients, weights, params, Smax_list, Dmax = row
+    Mmax, Cmax, Vmin = params[:3]
+    calculator.past_solutions.clear()
+    results = []
+    for Smax in Smax_list:
+        calculator.set_params(Mmax, Cmax, Vmin, Smax, Dmax)
+        results.append(calculator.solve(nutrients, weights))
+    return results
+
+
+# Mix with the least waste (objective "s") or the least penalty ("d") in a worker process
+# point = (nutrients, weights, params, objective, largest deviation)
+def solve_least(point):
+    nutrients, weights, params, objective, delta_max = point
+    calculator.set_params(*params)
+    return calculator.solve_least(nutrients, weights, objective, delta_max)
+
+
+# Limits from zero to value (steps values, without repetitions)
+def limits(value, steps):
+    return sorted(set(value * k / (steps - 1) for k in range(steps)))
+
+
+# True if objectives a are equal to objectives b
+def same(a, b):
+    return all(abs(x - y) <= TOLERANCE * max(1.0, abs(y)) for x, y in zip(a, b))
+
+
+# True if objectives a are not worse than objectives b, and better in at least one
+def dominates(a, b):
+    tolerances = [TOLERANCE * max(1.0, abs(v)) for v in b]
+    return all(x <= y + t for x, y, t in zip(a, b, tolerances)) and any(x < y - t for x, y, t in zip(a, b, tolerances))
+
+
+# Mixes of results that are not dominated by another mix (the same objectives are kept once), by increasing delta
+def non_dominated(results):
+    front = []
+    for result in sorted(results, key=lambda result: result[0]):
+        if any(same(other[0], result[0]) or dominates(other[0], result[0]) for other in front):
+            continue
+        front = [other for other in front if not dominates(result[0], other[0])]
+        front.append(result)
+    return front
+
+
+# Calculate the Pareto front of (delta, s, d) for one target
+# params : (Mmax, Cmax, Vmin, Smax, Dmax), Smax and Dmax are the largest limits tried (None for default parameters)
+# steps : limits of waste and of penalty tried (steps x steps solves)
+# workers : number of processes (default: number of CPUs, at most one per row)
+# max_seconds, max_gap : limits of the search for each point (see MixCalculator.set_limits)
+# warm_start : start each solve from the previous mix of its row (CBC may then stop at slightly worse mixes)
+# extra_delta : deviation over the best one of the mixes of the payoff table, whose waste and penalty are the largest limits
+# Returns the non-dominated mixes (same tuples returned by MixCalculator.solve) by increasing delta,
+# empty if there is no mix with the given parameters
+def pareto_front(nutrients, weights, params=None, steps=constants.PARETO_STEPS, workers=None, max_seconds=constants.DEFAULT_MAX_SECONDS,
+                 max_gap=constants.DEFAULT_MAX_GAP, warm_start=True, formulas_db=None, solutions_db=None, extra_delta=constants.PARETO_EXTRA_DELTA):
+    assert steps >= 2, "Pareto front needs at least 2 steps"
+    if params is None:
+        params = DEFAULT_PARAMS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers > 0, "Number of workers should be positive"
+    assert extra_delta >= 0, "Extra deviation should be non-negative"
+
+    with ProcessPoolExecutor(max_workers=min(workers, steps), initializer=init_worker, initargs=(max_seconds, max_gap, warm_start, formulas_db, solutions_db)) as executor:
+        # payoff table: best mix with the user's limits, then least waste and least penalty close to its deviation
+        best = executor.submit(solve_row, (nutrients, weights, params, [params[3]], params[4])).result()[0]
+        if best[7] not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+            return []
+        points = [(nutrients, weights, params, objective, best[0][0] + extra_delta) for objective in ("s", "d")]
+        payoff = [best] + [result for result in executor.map(solve_least, points) if result[7] in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE)]
+
+        # largest waste and penalty worth trying
+        Smax_list = limits(max(result[0][1] for result in payoff), steps)
+        rows = [(nutrients, weights, params, Smax_list, Dmax) for Dmax in limits(max(result[0][2] for result in payoff), steps)]
+        results = payoff
+        for row_results in executor.map(solve_row, rows):
+            results.extend(result for result in row_results if result[7] in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE))
+
+    return non_dominated(results)
+
+
+# Mixes of a Pareto front with at most extra_delta more deviation than the best one, by increasing waste and penalty
+def within_deviation(front, extra_delta=constants.PARETO_EXTRA_DELTA):
+    if len(front) == 0:
+        return []
+    best_delta = min(result[0][0] for result in front)
+    return sorted((result for result in front if result[0][0] <= best_delta + extra_delta), key=lambda result: (result[0][1], result[0][2]))
@@ -0,0 +1,50 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Presolve of the catalog: products that cannot improve the mix are left out of the model
+# - products without nutrients (they only add volume and waste)
+# Presolve is exact: the best mix is the same as without it. Products of the same kind with the same nutrient values,
+# bottle volume and priority are all kept, since using two of them is the only way to have the stock of both
+# (merging them, or leaving out those with less stock, would break Mmax/Cmax or lose a mix): only their order is fixed,
+# see symmetry_chains
+
+import numpy as np
+
+
+# Products of the reduced catalog
+# a : nutrient values (formulas, then solutions)
+# Returns the catalog indexes of the products kept, in catalog order: each one is a product of the model
+def reduce_catalog(a):
+    a = np.asarray(a)
+    return [i for i in range(len(a)) if a[i].any()]
+
+
+# Chains of identical products of the model: same kind, nutrient values, bottle volume and priority
+# a, b : nutrient values and bottle volumes of the products of the model (formulas, then solutions)
+# p : priorities of the formulas, fmax : number of bottles of each product
+# Returns a list of chains (lists of at least two indexes of products), most bottles first, then in model order.
+# A mix using a product of a chain but not one before it can use that one instead (it has as many bottles),
+# so the model only keeps mixes with y[chain[k+1]] <= y[chain[k]]
+def symmetry_chains(a, b, p, fmax, nFormulas):
+    a = np.asarray(a)
+    classes = {}
+    for i in range(len(a)):
+        formula = i < nFormulas
+        key = (formula, a[i].tobytes(), float(b[i]), float(p[i]) if formula else None)
+        classes.setdefault(key, []).append(i)
+    return [sorted(members, key=lambda i: (-int(fmax[i]), i)) for members in classes.values() if len(members) > 1]
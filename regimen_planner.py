@@ -0,0 +1,332 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Multi-day regimen: the mixes of D consecutive days for one patient, linked by the bottles opened
+# A bottle opened on day u can still feed the next days within its hang time, so volume left in it is not wasted
+# if the next days' mixes use it. Since a bottle may be opened at the start of day u, it can feed day u + k
+# only if it may hang for the whole k + 1 days: days u to u + hang_hours // 24 - 1 (48 hours: days u and u + 1)
+# Targets can change from day to day (e.g. from calculate_nutrients with the patient's weight of each day)
+#
+# Solved in two stages, as the ward mode (see ward_calculator.py):
+# 1. deviation: each day's best mix, by a separate solve with MixCalculator (days do not limit each other, stock is per day)
+# 2. waste: the regimen model minimizes total formula waste, with each day's delta fixed to the one of stage 1 (plus extra_delta)
+#    and each day's products fixed to those of stage 1; with full_search, products can change too, starting from that plan
+#
+# Rolling horizon: when day 0 has been given, roll() plans the remaining days again, carrying over the volume left in bottles
+# still within their hang time. Days whose target did not change keep the deltas and products of the previous plan
+# (no new separate solve), and the bottles of the previous plan are the starting solution
+
+import sys
+import time
+
+import numpy as np
+from mip import *
+from mip.cbc import cbclib, ffi
+
+import constants
+from mix_calculator import MixCalculator, STAGE_TOLERANCE, STAGE_TOLERANCE_ABS
+
+
+class RegimenPlanner():
+    # hang_hours : how long an opened bottle can be used [h]; less than 48 hours means no carry over to the next day
+    # extra_delta : deviation that each day can lose (absolute, e.g. 0.01 = 1%) to reduce waste
+    # full_search : in stage 2, also look for mixes with other products
+    # plan_seconds : time limit of each solve of the regimen model (max_seconds is the one of each day's separate solve)
+    # Model parameters (Mmax, Cmax, Vmin, Dmax) and stock are per day; other arguments as MixCalculator
+    # (an inventory only gives the stock of each day: the plan's bottles are not taken from it, they are taken day by day)
+    def __init__(self, Mmax=5, Cmax=5, Vmin=1, Smax=3000, Dmax=3000, hang_hours=48, extra_delta=0.0, full_search=False,
+                 plan_seconds=constants.REGIMEN_MAX_SECONDS, max_seconds=INF, max_gap=1e-4, formulas_db=None, solutions_db=None, inventory_db=None):
+        assert hang_hours >= 0, "Hang time should be non-negative"
+        assert extra_delta >= 0, "Extra deviation should be non-negative"
+        # days after the opening one that a bottle can feed (whole days within hang time, counting the opening day)
+        self.hang_days = max(int(hang_hours // 24) - 1, 0)
+        self.extra_delta = extra_delta
+        self.full_search = full_search
+        self.plan_seconds = plan_seconds
+        self.verbose = 0
+        # catalog data, and separate solves of stage 1
+        self.calculator = MixCalculator(Mmax, Cmax, Vmin, Smax, Dmax, max_seconds=max_seconds, max_gap=max_gap, formulas_db=formulas_db,
+                                        solutions_db=solutions_db, inventory_db=inventory_db)
+        self.calculator.model.verbose = 0
+        self.targets = []
+        self.days = []
+        self.carried = []
+        self.f_values = None
+
+
+    # Plan the regimen: targets = list of (nutrients, weights), one for each day
+    # carried : volume left in bottles opened before day 0, list of (product of the model, volume, last day it can be used)
+    # Returns one result for each day, like MixCalculator.solve, where s and the number of bottles of each component are None
+    # (waste and bottles are of the whole regimen). Regimen's results are in attributes: bottles (bottles opened each day:
+    # list of (name, number, bottle volume) for each day), waste (total formula waste, including volume carried and not used),
+    # separate_waste (total waste of the separate mixes), status, stage_seconds (separate solves, then each solve of the model)
+    def plan(self, targets, carried=None):
+        return self.solve(targets, [None for target in targets], carried if carried is not None else [])
+
+
+    # Plan again from the next day: day 0 of the current plan has been given
+    # targets : targets of the remaining days (None to keep those of the current plan), may also add days at the end
+    def roll(self, targets=None):
+        assert self.f_values is not None, "No plan to roll"
+        if targets is None:
+            targets = self.targets[1:]
+
+        # volume left after day 0 in bottles opened on day 0, or carried, that can still be used
+        carried = []
+        for i in range(len(self.f[0])):
+            volume = self.calculator.b[i] * self.f_values[0][i] - self.v_values[0][0][i]
+            if self.hang_days > 0 and volume > 1e-6:
+                carried.append((i, float(volume), self.hang_days - 1))
+        for k, (i, volume, last_day) in enumerate(self.carried):
+            volume -= self.c_values[k][0]
+            if last_day >= 1 and volume > 1e-6:
+                carried.append((i, float(volume), last_day - 1))
+
+        # days with the same target keep their stage 1 (and their bottles as starting solution)
+        previous = []
+        for t, target in enumerate(targets):
+            if t + 1 < len(self.targets) and self.same_target(target, self.targets[t + 1]):
+                day = dict(self.days[t + 1])
+                day["bottles"] = self.f_values[t + 1]
+                previous.append(day)
+            else:
+                previous.append(None)
+        return self.solve(targets, previous, carried)
+
+
+    def same_target(self, a, b):
+        return [float(v) for v in a[0]] == [float(v) for v in b[0]] and [float(v) for v in a[1]] == [float(v) for v in b[1]]
+
+
+    # Stage 1 for days without previous (dictionary of a day of the previous plan), then stage 2 (see above)
+    def solve(self, targets, previous, carried):
+        calculator = self.calculator
+        self.stage_seconds = []
+
+        # Stage 1, decomposition: each day on its own
+        start = time.perf_counter()
+        days = []
+        for target, day in zip(targets, previous):
+            if day is None:
+                result = calculator.solve(*target)
+                day = {"result": result, "quantities": None, "bottles": None}
+                if calculator.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                    values = calculator.solution_values()
+                    day["quantities"] = values[calculator.x_cols]
+                    day["bottles"] = values[calculator.f_cols]
+            days.append(day)
+        self.stage_seconds.append(time.perf_counter() - start)
+
+        self.targets = list(targets)
+        self.days = days
+        self.carried = carried
+        self.separate_waste = sum(day["result"][0][1] for day in days if day["quantities"] is not None)
+        self.status = OptimizationStatus.OPTIMAL
+        self.bottles = [[] for day in days]
+        self.waste = 0.0
+        self.f_values = None
+        results = [day["result"] for day in days]
+
+        # Stage 2: least waste, with each day's deviation and products fixed
+        self.create_model(targets, days, carried)
+        start = [(var, float(day["bottles"][i])) for day, row in zip(days, self.f) if day["bottles"] is not None for i, var in enumerate(row)]
+        start += [(var, float(day["quantities"][i] > 0)) for day, row in zip(days, self.y) if day["quantities"] is not None for i, var in enumerate(row)]
+        self.model.start = start
+        if not self.optimize():
+            return results
+        plan_results = self.get_results(days)
+
+        # products free, starting from the plan found (the plan above is kept if none is found within the time limit)
+        if self.full_search:
+            products = range(calculator.nFormulas + calculator.nSolutions)
+            values = self.solution_values()
+            self.model.start = [(var, values[var.idx]) for row in self.f + self.y for var in row]
+            for day, row in zip(days, self.y):
+                if day["quantities"] is not None:
+                    for var in row:
+                        var.lb = 0.0
+                        var.ub = 1.0
+            for i, row in zip(products, zip(*self.f)):
+                for var in row:
+                    var.ub = float(calculator.fmax[i])
+            status = self.status
+            if self.optimize():
+                plan_results = self.get_results(days)
+            else:
+                self.status = status
+
+        for t, result in enumerate(plan_results):
+            if result is not None:
+                results[t] = result
+        return results
+
+
+    # Regimen model for targets of each day, days' stage 1 (a day without quantities has no mix) and carried volumes
+    def create_model(self, targets, days, carried):
+        calculator = self.calculator
+        products = range(calculator.nFormulas + calculator.nSolutions)
+        D = range(len(targets))
+        M = calculator.M
+        C = calculator.C
+        N = calculator.N
+        a = calculator.a
+        b = calculator.b
+        H = self.hang_days
+
+        self.model = Model(sense=MINIMIZE, solver_name=CBC)
+        self.model.verbose = self.verbose
+        self.model.max_seconds = min(self.plan_seconds, sys.float_info.max)     # CBC does not accept INF
+        self.model.max_mip_gap = calculator.max_gap
+
+        ##### VARIABLES #####
+
+        # var f = number of bottles opened each day, up to the stock
+        self.f = [[self.model.add_var(var_type=INTEGER, lb=0, ub=float(calculator.fmax[i])) for i in products] for u in D]
+
+        # var v = volume of bottles opened on day u used on day t (u <= t <= u + H)
+        self.v = [{t: [self.model.add_var(lb=0.0) for i in products] for t in D if u <= t <= u + H} for u in D]
+
+        # var c = volume carried from before day 0 used on day t
+        self.c = [{t: self.model.add_var(lb=0.0) for t in D if t <= last_day} for i, volume, last_day in carried]
+
+        # var x = volume of each product each day, y = 1 if and only if it is used that day
+        # (fixed to the products of stage 1)
+        self.x = [[self.model.add_var(lb=0.0) for i in products] for t in D]
+        self.y = []
+        for day in days:
+            used = day["quantities"] > 0 if day["quantities"] is not None else np.zeros(len(products), dtype=bool)
+            self.y.append([self.model.add_var(var_type=BINARY, lb=float(used[i]), ub=float(used[i])) for i in products])
+
+        # no bottles of products that no day within hang time uses (only while products are fixed)
+        for u in D:
+            for i in products:
+                if all(self.y[t][i].ub == 0.0 for t in self.v[u]):
+                    self.f[u][i].ub = 0.0
+
+        # var delta = max of % deviations of each day, at most the one of stage 1
+        self.delta = []
+        for day in days:
+            ub = INF
+            if day["quantities"] is not None:
+                ub = day["result"][0][0] * (1 + STAGE_TOLERANCE) + STAGE_TOLERANCE_ABS + self.extra_delta
+            self.delta.append(self.model.add_var(lb=0.0, ub=ub))
+
+        # var n = obtained nutrient values of each day
+        self.n = [[self.model.add_var(lb=0.0) for j in N] for t in D]
+
+        # var S = total formula waste
+        self.S = self.model.add_var(lb=0.0)
+
+        ##### CONSTRAINTS #####
+
+        # most volume of a product available on one day: bottles opened that day and the previous ones within hang time, and carried
+        available = [b[i] * calculator.fmax[i] * (H + 1) + sum(volume for k, volume, last_day in carried if k == i) for i in products]
+
+        for u in D:
+            for i in products:
+                # bottles opened hold the volume used from them, and are the minimum necessary
+                used = xsum(self.v[u][t][i] for t in self.v[u])
+                self.model += used <= b[i] * self.f[u][i]
+                self.model += used >= b[i] * (self.f[u][i] - 1) + calculator.Vmin_list[i]
+
+        for k, (i, volume, last_day) in enumerate(carried):
+            self.model += xsum(self.c[k].values()) <= volume
+
+        for t in D:
+            x = self.x[t]
+            y = self.y[t]
+            for i in products:
+                self.model += x[i] == xsum(self.v[u][t][i] for u in D if t in self.v[u]) + xsum(self.c[k][t] for k in range(len(carried)) if carried[k][0] == i and t in self.c[k])
+                self.model += x[i] >= calculator.Vmin_list[i] * y[i]
+                self.model += x[i] <= available[i] * y[i]
+
+            self.model += xsum(y[m] for m in M) <= calculator.Mmax
+            self.model += xsum(y[s] for s in C) <= calculator.Cmax
+
+            for j in N:
+                self.model += self.n[t][j] == xsum(a[i][j] * 0.01 * x[i] for i in products)
+
+            self.model += xsum((1 - calculator.p[m]) * x[m] for m in M) <= calculator.Dmax
+
+            # deviation from the day's target (weights and values normalised as MixCalculator.set_target)
+            calculator.set_target(*targets[t])
+            for k in N:
+                if calculator.o[k] > 0.0:
+                    self.model += self.delta[t] >= calculator.w[k] * (self.n[t][k] / calculator.o[k] - 1)
+                    self.model += self.delta[t] >= calculator.w[k] * (- self.n[t][k] / calculator.o[k] + 1)
+
+        # waste: volume of formula bottles not used, and volume of formula carried and not used
+        self.model += self.S == xsum(b[m] * self.f[u][m] - xsum(self.v[u][t][m] for t in self.v[u]) for u in D for m in M) \
+                                + xsum(volume - xsum(self.c[k].values()) for k, (i, volume, last_day) in enumerate(carried) if i in M)
+        self.model.objective = minimize(self.S)
+
+
+    def optimize(self):
+        start = time.perf_counter()
+        self.status = self.model.optimize()
+        self.stage_seconds.append(time.perf_counter() - start)
+        return self.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE)
+
+
+    # Values of all columns of the regimen model in the last solution (see MixCalculator.solution_values)
+    def solution_values(self):
+        values = cbclib.Cbc_getColSolution(self.model.solver._model)
+        return np.frombuffer(ffi.buffer(values, self.model.num_cols * np.dtype(np.float64).itemsize), dtype=np.float64).copy()
+
+
+    # Results of each day of the regimen model (None for days without a mix), bottles of each day and waste
+    # Values of f, v and c are kept to roll the plan
+    def get_results(self, days):
+        calculator = self.calculator
+        values = self.solution_values()
+        if self.status == OptimizationStatus.OPTIMAL or self.model.objective_value <= 1e-10:
+            gap = 0.0
+        else:
+            gap = abs(self.model.objective_value - self.model.objective_bound) / abs(self.model.objective_value)
+
+        self.f_values = [values[[var.idx for var in row]] for row in self.f]
+        self.v_values = [{t: values[[var.idx for var in row]] for t, row in day.items()} for day in self.v]
+        self.c_values = [{t: float(values[var.idx]) for t, var in day.items()} for day in self.c]
+
+        results = []
+        self.bottles = []
+        for t, day in enumerate(days):
+            bottles = []
+            for i, number in enumerate(self.f_values[t].tolist()):
+                if round(number) > 0:
+                    bottles.append((calculator.product_names[calculator.products[i]], round(number), calculator.b[i]))
+            self.bottles.append(bottles)
+
+            if day["quantities"] is None:
+                results.append(None)
+                continue
+            quantities = values[[var.idx for var in self.x[t]]]
+            formulas = []
+            solutions = []
+            for i in np.flatnonzero(quantities > 1e-9).tolist():
+                component = (float(quantities[i]), calculator.product_names[calculator.products[i]], None, calculator.b[i])
+                if i < calculator.nFormulas:
+                    formulas.append(component)
+                else:
+                    solutions.append(component)
+            penalty = float(sum((1 - calculator.p[m]) * quantities[m] for m in calculator.M))
+            objectives = [float(values[self.delta[t].idx]), None, penalty]
+            nutrients = values[[var.idx for var in self.n[t]]].tolist()
+            results.append((objectives, len(formulas), len(solutions), formulas, solutions, nutrients, float(quantities.sum()), self.status, gap))
+        self.waste = float(values[self.S.idx])
+        return results
@@ -0,0 +1,150 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Cache of results of MixCalculator.solve
+# Results are kept in memory (least recently used are discarded when full) and optionally
+# in a sqlite file, so that they survive restarts of the app
+# Keys are made of normalised target nutrients and weights, model parameters, stock and the catalog's hash:
+# when the databases change, results of the old catalog are discarded
+
+import hashlib
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+# Significant digits of target nutrients used in keys (nearly equal targets share the same result)
+NUTRIENT_DIGITS = 4
+
+
+class ResultsCache():
+    def __init__(self, maxsize=256, path=None):
+        assert maxsize > 0, "Cache size should be positive"
+        self.maxsize = maxsize
+        self.path = path
+        self.memory = OrderedDict()
+        self.catalog_hash = None
+        self.connection = None
+
+        # statistics
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path is not None:
+            self.connection = sqlite3.connect(path, timeout=10)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, catalog TEXT, result BLOB)")
+            self.connection.commit()
+
+
+    # Solve target with calculator, or return the cached result
+    # Only results that do not depend on time limits are cached (optimal mix, or no mix at all)
+    # When the databases changed, calculator is built again and results of the old catalog are discarded (see key)
+    # On a hit, calculator records the metrics of a cached result (see MixCalculator.record_cached)
+    def solve(self, calculator, user_nutrients, user_weights):
+        calculator.refresh_catalog()
+        start = time.perf_counter()
+        calculator.refresh_stock()
+        key = self.key(calculator, user_nutrients, user_weights)
+
+        result = self.get(key)
+        if result is not None:
+            calculator.record_cached(result, time.perf_counter() - start)
+            return result
+
+        self.misses += 1
+        result = calculator.solve(user_nutrients, user_weights)
+        if result[-2].name in ("OPTIMAL", "INFEASIBLE"):
+            self.put(key, result)
+        return result
+
+
+    # Key of a target for calculator's current catalog, parameters and gap limit
+    def key(self, calculator, user_nutrients, user_weights):
+        # discard results of another catalog
+        if calculator.catalog_hash != self.catalog_hash:
+            self.set_catalog(calculator.catalog_hash)
+
+        nutrients = tuple(float(f"{float(n):.{NUTRIENT_DIGITS}g}") if float(n) > 0.0 else 0.0 for n in user_nutrients)
+        weights = tuple(round(min(max(float(w), 0.0), 1.0), 2) for w in user_weights)
+        params = (int(calculator.Mmax), int(calculator.Cmax), float(calculator.Vmin), float(calculator.Smax), float(calculator.Dmax), float(calculator.max_gap), calculator.presolve,
+                  calculator.staged, calculator.backend, calculator.candidates)
+        stock = hashlib.sha256(calculator.product_fmax.tobytes()).hexdigest()[:16]
+        return repr((calculator.catalog_hash, params, stock, nutrients, weights))
+
+
+    # Cached result of key (None if not cached)
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        if self.connection is not None:
+            row = self.connection.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                result = pickle.loads(row[0])
+                self.put_memory(key, result)
+                self.hits += 1
+                self.disk_hits += 1
+                return result
+        return None
+
+
+    # Save result of key
+    def put(self, key, result):
+        self.put_memory(key, result)
+        if self.connection is not None:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, self.catalog_hash, pickle.dumps(result)))
+            self.connection.commit()
+
+
+    def put_memory(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+
+    # Use a new catalog: results of other catalogs are discarded
+    def set_catalog(self, catalog_hash):
+        self.catalog_hash = catalog_hash
+        self.memory.clear()
+        if self.connection is not None:
+            self.connection.execute("DELETE FROM results WHERE catalog != ?", (catalog_hash,))
+            self.connection.commit()
+
+
+    # Remove all results
+    def clear(self):
+        self.memory.clear()
+        if self.connection is not None:
+            self.connection.execute("DELETE FROM results")
+            self.connection.commit()
+
+
+    # Hits and misses counters
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.memory)}
+
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -18,7 +18,6 @@
 
 import tkinter as tk
 from tkinter import font, ttk
-import pandas as pd
 
 from constants import LABELS
 
@@ -60,6 +59,10 @@ class ResultsManager():
         self.label_d = ttk.Label(master=frame_objectives)
         self.label_d.pack(side=tk.TOP, padx=15, anchor='w')
 
+        # Create space for solver's status (no mix found, time limit reached)
+        self.label_status = ttk.Label(master=frame_objectives)
+        self.label_status.pack(side=tk.TOP, anchor='w')
+
         # Create space for result's formulas and solutions
         self.frame_tables = ttk.Frame(master=self.container_output)
         self.frame_tables.pack(pady=1)
@@ -105,14 +108,43 @@ class ResultsManager():
 
     # Copy formatted results to clipboard
     def copy_to_clipboard(self):
+        import pandas as pd     # imported here to keep pandas out of the app's start-up
         pd.DataFrame([self.results_string_for_clipboard]).to_clipboard(excel=False, index=False, header=False)
         # clipboards.to_clipboard(self.results_string_for_clipboard, excel=False)
 
 
+    # Remove previous results from widgets
+    def clear(self):
+        self.label_objectives['text'] = ""
+        self.label_delta['text'] = ""
+        self.label_s['text'] = ""
+        self.label_d['text'] = ""
+        self.label_status['text'] = ""
+        self.table_formulas.pack_forget()
+        self.table_solutions.pack_forget()
+        self.label_volume['text'] = ""
+        for widget in self.frame_nutrient_results.grid_slaves():
+            widget.destroy()
+        self.button_copy.pack_forget()
+        self.results_string_for_clipboard = ""
+
+
     # Write results in widgets and save them in a formatted string
-    def write(self, objectives, M_used, C_used, formulas, solutions, nutrients, volume):
+    # status is the name of the solver's status (OPTIMAL, FEASIBLE if time limit was reached, ...), gap the relative gap from the optimal mix
+    def write(self, objectives, M_used, C_used, formulas, solutions, nutrients, volume, status, gap):
+        # No mix found
+        if objectives[0] == None:
+            self.clear()
+            self.label_status['text'] = LABELS.string_no_solution
+            return
+
         self.label_objectives['text'] = LABELS.string_objectives
 
+        if status == "FEASIBLE":
+            self.label_status['text'] = LABELS.string_limit_reached.format(gap=gap * 100)
+        else:
+            self.label_status['text'] = ""
+
         self.label_delta['text'] = LABELS.string_delta + " = " + str(round(objectives[0] * 100, 2)) + "%"
         self.label_s['text'] = LABELS.string_s + " = " + str(round(objectives[1])) + " " + LABELS.string_s_unit
         self.label_d['text'] = LABELS.string_d + " = " + str(round(objectives[2], 1))
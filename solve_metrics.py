@@ -0,0 +1,95 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Instrumentation of solves: time of each phase and solver's statistics of one solve, as one record
+# Records can also be appended to a log file as JSON lines (one JSON object per solve), to compare runs or find slow targets
+
+import json
+import time
+
+
+# Fields of a record, in the order written in the log (times in seconds)
+# catalog_seconds, build_seconds : loading of the catalog and building of the model, done once by the calculator (same in all its records)
+# set_target_seconds : refresh of the stock and constraints of the new target
+# optimize_seconds : solver's wall time (all backends and stages, without extraction of results)
+# stage_seconds : solver's wall time of each stage (one without staged, none for cached results)
+# extraction_seconds : extraction of results from the solution
+# total_seconds : wall time of the whole solve
+# nodes, iterations : branch and bound nodes and simplex iterations (0 when the backend does not report them)
+# gap, status : relative gap between the mix found and the best possible one, solver's status
+# backend : backend that found the mix (None for cached results)
+# restricted : True if the mix was found with only candidate products (None without candidates)
+# cached : result taken from the results' cache, without solving
+FIELDS = ("time", "catalog_seconds", "build_seconds", "set_target_seconds", "optimize_seconds", "stage_seconds", "extraction_seconds", "total_seconds",
+          "nodes", "iterations", "gap", "status", "backend", "restricted", "cached")
+
+# Default values of fields not given
+DEFAULTS = {"catalog_seconds": 0.0, "build_seconds": 0.0, "set_target_seconds": 0.0, "optimize_seconds": 0.0, "extraction_seconds": 0.0, "total_seconds": 0.0,
+            "nodes": 0, "iterations": 0, "cached": False}
+
+
+# Metrics of one solve (see FIELDS), time is when the record was created (seconds since the epoch)
+class SolveMetrics():
+    def __init__(self, **values):
+        unknown = set(values) - set(FIELDS)
+        assert len(unknown) == 0, "Unknown metrics: " + ", ".join(sorted(unknown))
+        for field in FIELDS:
+            setattr(self, field, values.get(field, DEFAULTS.get(field)))
+        if self.time is None:
+            self.time = time.time()
+        if self.stage_seconds is None:
+            self.stage_seconds = []
+
+
+    # Record as a dictionary of plain values (for JSON)
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+    # Lines of text for the debug panel of the app
+    def format_lines(self):
+        if self.cached:
+            lines = ["Cached result"]
+        else:
+            lines = [f"Backend: {self.backend}" + (" (candidates)" if self.restricted else "")]
+        lines.append(f"Status: {self.status}" + (f", gap {self.gap * 100:.3f}%" if self.gap is not None else ""))
+        lines.append(f"Nodes: {self.nodes}, iterations: {self.iterations}")
+        for label, field in (("Catalog", "catalog_seconds"), ("Model", "build_seconds"), ("Set target", "set_target_seconds"), ("Optimize", "optimize_seconds"),
+                             ("Extraction", "extraction_seconds"), ("Total", "total_seconds")):
+            lines.append(f"{label}: {getattr(self, field) * 1000:.1f} ms")
+            if field == "optimize_seconds" and len(self.stage_seconds) > 1:
+                lines.append("Stages: " + ", ".join(f"{seconds * 1000:.1f}" for seconds in self.stage_seconds) + " ms")
+        return lines
+
+
+# Log of metrics: each record is appended as one JSON line
+# The file is opened for each record, so several processes can share the same log (each line is written at once)
+class MetricsLog():
+    def __init__(self, path):
+        self.path = path
+
+
+    def write(self, metrics):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(metrics.to_dict()) + "\n")
+
+
+# Read all records of a log file
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [SolveMetrics(**json.loads(line)) for line in f if line.strip() != ""]
@@ -0,0 +1,297 @@
+# Copyright: (c) 2024, Anita Papetti <anitapapetti.dev@gmail.com>
+#
+# This file is part of NutriOptiMix
+#
+# NutriOptiMix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NutriOptiMix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NutriOptiMix.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Ward mode: one model for all the patients of a ward, sharing bottles and stock
+# An opened bottle can be split among patients (within its hang time), so the ward wastes less formula
+# than patients solved separately, where each patient opens their own bottles
+#
+# Solved in two stages:
+# 1. deviation: each patient's best delta is found by a separate solve with MixCalculator (decomposition);
+#    if the ward's stock is enough for all these mixes together they are the best ones for the ward, otherwise
+#    the ward model minimizes the max of deviations and then their sum (or only their sum), with the separate deltas as lower bounds
+# 2. waste: the ward model minimizes total formula waste, with the delta of each patient fixed to the one
+#    of stage 1 (plus extra_delta, if allowed) and the products of each patient fixed to those of stage 1
+#    (volumes and bottles change, products do not: a small problem, solved in a fraction of a second);
+#    with full_search, products can change too, starting from that mix (much slower at 30 beds)
+
+import sys
+import time
+
+import numpy as np
+from mip import *
+from mip.cbc import cbclib, ffi
+
+from mix_calculator import MixCalculator, STAGE_TOLERANCE, STAGE_TOLERANCE_ABS
+
+
+# Ward objectives of stage 1 (deviation)
+MAX_DELTA = "max"
+SUM_DELTA = "sum"
+
+
+class WardCalculator():
+    # Model parameters (Mmax, Cmax, Vmin, Dmax) are the same for all patients; waste is minimized for the whole ward (Smax is
+    # only used by the separate solves)
+    # objective : MAX_DELTA (worst patient's deviation) or SUM_DELTA (sum of deviations), when stock is not enough for the best mixes
+    # extra_delta : deviation that each patient can lose (absolute, e.g. 0.01 = 1%) to reduce the ward's waste
+    # full_search : in stage 2, also look for mixes with other products (see above)
+    # max_seconds, max_gap : limits of the search of each solve (see MixCalculator.set_limits)
+    # other arguments as MixCalculator (with an inventory, solve_and_take takes the ward's bottles from it)
+    def __init__(self, Mmax=5, Cmax=5, Vmin=1, Smax=3000, Dmax=3000, objective=MAX_DELTA, extra_delta=0.0, full_search=False, max_seconds=INF,
+                 max_gap=1e-4, formulas_db=None, solutions_db=None, inventory_db=None):
+        assert objective in (MAX_DELTA, SUM_DELTA), "Ward objective should be 'max' or 'sum'"
+        assert extra_delta >= 0, "Extra deviation should be non-negative"
+        self.objective = objective
+        self.extra_delta = extra_delta
+        self.full_search = full_search
+        self.verbose = 0
+        # catalog data, and separate solves of stage 1
+        self.calculator = MixCalculator(Mmax, Cmax, Vmin, Smax, Dmax, max_seconds=max_seconds, max_gap=max_gap, formulas_db=formulas_db,
+                                        solutions_db=solutions_db, inventory_db=inventory_db)
+        self.calculator.model.verbose = 0
+
+
+    # Solve the ward and take its bottles from the inventory, all in one transaction
+    # If other processes took some of the bottles first, solve again with the stock left
+    def solve_and_take(self, targets):
+        calculator = self.calculator
+        assert calculator.inventory is not None, "Taking bottles needs an inventory"
+        while True:
+            results = self.solve(targets)
+            if self.status not in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                return results
+            bottles = {calculator.product_keys[k]: number for k, number in self.bottles_used}
+            if calculator.inventory.take(bottles, calculator.fmax_default):
+                return results
+
+
+    # Solve the ward: targets = list of (nutrients, weights), one for each patient
+    # Returns one result for each patient, like MixCalculator.solve, where s and the number of bottles of each component
+    # are None (waste and bottles are of the whole ward)
+    # Ward's results are in attributes: bottles (bottles opened: name, number, bottle volume), bottles_used (catalog index,
+    # number of bottles), waste (total formula waste), separate_waste (total waste of the separate mixes), status (of the
+    # ward model, OPTIMAL if it was not needed) and stage_seconds (separate solves, then each solve of the ward model)
+    def solve(self, targets):
+        calculator = self.calculator
+        self.stage_seconds = []
+
+        # Stage 1, decomposition: each patient on their own
+        start = time.perf_counter()
+        separate = []
+        quantities = []
+        for nutrients, weights in targets:
+            separate.append(calculator.solve(nutrients, weights))
+            if calculator.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE):
+                quantities.append(calculator.solution_values()[calculator.x_cols])
+        self.stage_seconds.append(time.perf_counter() - start)
+
+        # patients without a mix on their own have none in the ward either
+        patients = [k for k, result in enumerate(separate) if result[7] in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE)]
+        self.separate_waste = sum(separate[k][0][1] for k in patients)
+        self.status = OptimizationStatus.OPTIMAL
+        self.bottles = []
+        self.bottles_used = []
+        self.waste = 0.0
+        results = list(separate)
+        if len(patients) == 0:
+            return results
+
+        self.create_model([targets[k] for k in patients], [separate[k] for k in patients])
+
+        # stock is enough for the separate mixes together: they are the best for each patient, and a starting solution for stage 2
+        quantities = np.array(quantities)
+        bottles = np.ceil(quantities.sum(axis=0) / calculator.b - 1e-9)
+        if (bottles <= calculator.fmax).all():
+            deltas = [separate[k][0][0] for k in patients]
+            start = [(self.f[i], float(bottles[i])) for i in range(len(self.f))]
+            for p in range(len(patients)):
+                start += [(self.x[p][i], float(quantities[p][i])) for i in range(len(self.f))]
+                start += [(self.y[p][i], float(quantities[p][i] > 0)) for i in range(len(self.f))]
+        # otherwise stage 1 on the ward model
+        else:
+            # worst deviation first, then the others as low as possible (not only up to the worst one)
+            if self.objective == MAX_DELTA:
+                worst = self.model.add_var(lb=0.0)
+                for delta in self.delta:
+                    self.model += worst >= delta
+                self.model.objective = minimize(worst)
+                if not self.optimize():
+                    return results
+                worst.ub = self.solution_values()[worst.idx] * (1 + STAGE_TOLERANCE) + STAGE_TOLERANCE_ABS
+                self.model.start = [(var, value) for var, value in zip(self.model.vars, self.solution_values().tolist())]
+            self.model.objective = minimize(xsum(self.delta))
+            if not self.optimize():
+                return results
+            values = self.solution_values()
+            deltas = [values[delta.idx] for delta in self.delta]
+            start = [(var, values[var.idx]) for var in self.f + [var for row in self.x + self.y for var in row]]
+
+        # Stage 2: least waste, with each patient's deviation and products fixed
+        for delta, value in zip(self.delta, deltas):
+            delta.ub = value * (1 + STAGE_TOLERANCE) + STAGE_TOLERANCE_ABS + self.extra_delta
+        used = {var.idx: round(value) for var, value in start}
+        for row in self.y:
+            for var in row:
+                var.lb = var.ub = used[var.idx]
+        self.model.objective = minimize(self.S)
+        self.model.start = start
+        if not self.optimize():
+            return results
+        ward_results = self.get_results()
+
+        # products free, starting from the mixes found (results above are kept if no mix is found within the time limit)
+        if self.full_search:
+            values = self.solution_values()
+            self.model.start = [(var, values[var.idx]) for var in self.f + [var for row in self.x + self.y for var in row]]
+            for row in self.y:
+                for var in row:
+                    var.lb = 0.0
+                    var.ub = 1.0
+            status = self.status
+            if self.optimize():
+                ward_results = self.get_results()
+            else:
+                self.status = status
+
+        for k, result in zip(patients, ward_results):
+            results[k] = result
+        return results
+
+
+    # Ward model for patients' targets = list of (nutrients, weights), separate = results of their separate solves
+    def create_model(self, targets, separate):
+        calculator = self.calculator
+        products = range(calculator.nFormulas + calculator.nSolutions)
+        patients = range(len(targets))
+        M = calculator.M
+        C = calculator.C
+        N = calculator.N
+        a = calculator.a
+        b = calculator.b
+
+        self.model = Model(sense=MINIMIZE, solver_name=CBC)
+        self.model.verbose = self.verbose
+        self.model.max_seconds = min(calculator.max_seconds, sys.float_info.max)     # CBC does not accept INF
+        self.model.max_mip_gap = calculator.max_gap
+
+        ##### VARIABLES #####
+
+        # var x = volume of formula or solution for each patient [ml], y = 1 if and only if the patient uses it
+        self.x = [[self.model.add_var(lb=0.0, ub=float(b[i] * calculator.fmax[i])) for i in products] for p in patients]
+        self.y = [[self.model.add_var(var_type=BINARY) for i in products] for p in patients]
+
+        # var f = number of bottles opened for the ward, up to the stock
+        self.f = [self.model.add_var(var_type=INTEGER, lb=0, ub=float(calculator.fmax[i])) for i in products]
+
+        # var delta = max of % deviations of each patient; lower bound from the separate solve (the ward can only do worse)
+        self.delta = []
+        for p in patients:
+            delta = separate[p][0][0]
+            lb = 0.0
+            if separate[p][7] == OptimizationStatus.OPTIMAL:
+                lb = max(0.0, delta * (1 - calculator.max_gap) - STAGE_TOLERANCE_ABS)
+            self.delta.append(self.model.add_var(lb=lb))
+
+        # var n = obtained nutrient values of each patient
+        self.n = [[self.model.add_var(lb=0.0) for j in N] for p in patients]
+
+        # var S = total formula waste of the ward
+        self.S = self.model.add_var(lb=0.0)
+
+        ##### CONSTRAINTS #####
+
+        for i in products:
+            # bottles opened hold the volume of all patients, and are the minimum necessary
+            volume = xsum(self.x[p][i] for p in patients)
+            self.model += volume <= b[i] * self.f[i]
+            self.model += volume >= b[i] * (self.f[i] - 1) + calculator.Vmin_list[i]
+
+        for p in patients:
+            x = self.x[p]
+            y = self.y[p]
+            for i in products:
+                # a product used has at least volume Vmin, one not used has no volume
+                self.model += x[i] >= calculator.Vmin_list[i] * y[i]
+                self.model += x[i] <= b[i] * calculator.fmax[i] * y[i]
+
+            self.model += xsum(y[t] for t in M) <= calculator.Mmax
+            self.model += xsum(y[c] for c in C) <= calculator.Cmax
+
+            for j in N:
+                self.model += self.n[p][j] == xsum(a[i][j] * 0.01 * x[i] for i in products)
+
+            self.model += xsum((1 - calculator.p[t]) * x[t] for t in M) <= calculator.Dmax
+
+            # deviation from the patient's target (weights and values normalised as MixCalculator.set_target)
+            calculator.set_target(*targets[p])
+            for k in N:
+                if calculator.o[k] > 0.0:
+                    self.model += self.delta[p] >= calculator.w[k] * (self.n[p][k] / calculator.o[k] - 1)
+                    self.model += self.delta[p] >= calculator.w[k] * (- self.n[p][k] / calculator.o[k] + 1)
+
+        self.model += self.S == xsum(b[t] * self.f[t] - xsum(self.x[p][t] for p in patients) for t in M)
+
+
+    def optimize(self):
+        start = time.perf_counter()
+        self.status = self.model.optimize()
+        self.stage_seconds.append(time.perf_counter() - start)
+        return self.status in (OptimizationStatus.OPTIMAL, OptimizationStatus.FEASIBLE)
+
+
+    # Values of all columns of the ward model in the last solution (see MixCalculator.solution_values)
+    def solution_values(self):
+        values = cbclib.Cbc_getColSolution(self.model.solver._model)
+        return np.frombuffer(ffi.buffer(values, self.model.num_cols * np.dtype(np.float64).itemsize), dtype=np.float64).copy()
+
+
+    # Results of each patient of the ward model, and ward's bottles and waste
+    def get_results(self):
+        calculator = self.calculator
+        values = self.solution_values()
+        if self.status == OptimizationStatus.OPTIMAL or self.model.objective_value <= 1e-10:
+            gap = 0.0
+        else:
+            gap = abs(self.model.objective_value - self.model.objective_bound) / abs(self.model.objective_value)
+
+        results = []
+        for p in range(len(self.x)):
+            quantities = values[[var.idx for var in self.x[p]]]
+            formulas = []
+            solutions = []
+            for i in np.flatnonzero(quantities > 0).tolist():
+                quantity = float(quantities[i])
+                component = (quantity, calculator.product_names[calculator.products[i]], None, calculator.b[i])
+                if i < calculator.nFormulas:
+                    formulas.append(component)
+                else:
+                    solutions.append(component)
+            penalty = float(sum((1 - calculator.p[t]) * quantities[t] for t in calculator.M))
+            objectives = [float(values[self.delta[p].idx]), None, penalty]
+            nutrients = values[[var.idx for var in self.n[p]]].tolist()
+            results.append((objectives, len(formulas), len(solutions), formulas, solutions, nutrients, float(quantities.sum()), self.status, gap))
+
+        self.bottles = []
+        self.bottles_used = []
+        for i, var in enumerate(self.f):
+            number = round(values[var.idx])
+            if number > 0:
+                self.bottles.append((calculator.product_names[calculator.products[i]], number, calculator.b[i]))
+                self.bottles_used.append((calculator.products[i], number))
+        self.waste = float(values[self.S.idx])
+        return results